@@ -17,6 +17,9 @@
 import json
 
 import falcon
+from oslo_config import cfg
+
+CONF = cfg.CONF
 
 
 class BaseResource(object):
@@ -35,3 +38,37 @@ class BaseResource(object):
         except ValueError:
             raise falcon.HTTPError(falcon.HTTP_753, 'Malformed JSON')
         return json_data
+
+    @staticmethod
+    def list_params(req, sort_keys, filter_keys):
+        """Parses ?limit=&marker=&sort=<key>[:<asc|desc>] and the filters"""
+        limit = req.get_param_as_int('limit', min=1)
+        max_limit = CONF.get('max_limit')
+        if limit is None or limit > max_limit:
+            limit = max_limit
+
+        params = {
+            'filters': {},
+            'marker': req.get_param('marker'),
+            'limit': limit,
+            'sort_key': None,
+            'sort_dir': None,
+        }
+
+        sort = req.get_param('sort')
+        if sort:
+            sort_key, _, sort_dir = sort.partition(':')
+            if sort_key not in sort_keys or \
+                    sort_dir not in ('', 'asc', 'desc'):
+                raise falcon.HTTPInvalidParam(
+                    'Must be one of {} optionally followed by :asc or '
+                    ':desc'.format(', '.join(sort_keys)), 'sort')
+            params['sort_key'] = [sort_key]
+            params['sort_dir'] = sort_dir or None
+
+        for key in filter_keys:
+            value = req.get_param(key)
+            if value is not None:
+                params['filters'][key] = value
+
+        return params
@@ -18,9 +18,11 @@ import json
 import falcon
 
 from catena.api.v1 import backends
+from catena.api.v1 import benchmarks
 from catena.api.v1 import chains
 from catena.api.v1 import cloud
 from catena.api.v1 import homedoc
+from catena.api.v1 import jobs
 from catena.api.v1 import nodes
 
 VERSION = {
@@ -47,8 +49,14 @@ def public_endpoints():
 
         ('/chains/{chain_id}/nodes', nodes.NodeResource()),
         ('/chains/{chain_id}/nodes/{node_id}', nodes.NodeGetResource()),
+        ('/chains/{chain_id}/nodes/{node_id}/metrics',
+         nodes.NodeMetricsResource()),
+
+        ('/chains/{chain_id}/benchmarks', benchmarks.BenchmarksResource()),
 
         ('/backends', backends.BackendResource()),
+
+        ('/jobs/{job_id}', jobs.JobGetResource()),
     ]
 
 
@@ -22,13 +22,16 @@ from catena.service import service
 
 LOG = log.getLogger(__name__)
 
+SORT_KEYS = ('created_at', 'updated_at', 'name')
+FILTER_KEYS = ('status', 'owner')
+
 
 class ChainsResource(utils.BaseResource):
     def on_post(self, req, resp):
         LOG.debug("Creating a new blockchain")
 
         data = self.json_body(req)
-        service.create_chain(
+        result = service.create_chain(
             data['cloud_id'],
             data['name'],
             data['chain_config'],
@@ -36,11 +39,16 @@ class ChainsResource(utils.BaseResource):
         )
 
         resp.status = falcon.HTTP_202
+        resp.data = result
 
     def on_get(self, req, resp):
         LOG.debug("Listing all chains")
 
-        result = service.get_chains()
+        params = self.list_params(req, SORT_KEYS, FILTER_KEYS)
+        try:
+            result = service.get_chains(**params)
+        except ValueError as e:
+            raise falcon.HTTPBadRequest('Invalid list parameters', str(e))
 
         resp.status = falcon.HTTP_200
         resp.data = result
@@ -58,6 +66,7 @@ class ChainsGetResource(utils.BaseResource):
     def on_delete(self, req, resp, chain_id):
         LOG.debug("Delete chain: {}".format(chain_id))
 
-        service.delete_chain(chain_id)
-        resp.status = falcon.HTTP_200
-        resp.data = {}
+        result = service.delete_chain(chain_id)
+
+        resp.status = falcon.HTTP_202
+        resp.data = result
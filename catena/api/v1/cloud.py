@@ -22,10 +22,17 @@ from catena.service import service
 
 LOG = log.getLogger(__name__)
 
+SORT_KEYS = ('created_at', 'updated_at')
+FILTER_KEYS = ('type',)
+
 
 class CloudResource(utils.BaseResource):
     def on_get(self, req, resp):
-        result = service.get_clouds()
+        params = self.list_params(req, SORT_KEYS, FILTER_KEYS)
+        try:
+            result = service.get_clouds(**params)
+        except ValueError as e:
+            raise falcon.HTTPBadRequest('Invalid list parameters', str(e))
 
         resp.status = falcon.HTTP_200
         resp.data = result
@@ -30,8 +30,19 @@ class NodeGetResource(utils.BaseResource):
         resp.data = result
 
     def on_delete(self, req, resp, chain_id, node_id):
-        service.delete_node(chain_id, node_id)
+        result = service.delete_node(chain_id, node_id)
+
         resp.status = falcon.HTTP_202
+        resp.data = result
+
+
+class NodeMetricsResource(utils.BaseResource):
+    def on_get(self, req, resp, chain_id, node_id):
+        step = req.get_param_as_int('step', min=0)
+        result = service.get_node_metrics(chain_id, node_id, step)
+
+        resp.status = falcon.HTTP_200
+        resp.data = result
 
 
 class NodeResource(utils.BaseResource):
@@ -39,9 +50,13 @@ class NodeResource(utils.BaseResource):
         LOG.debug("Adding a new node")
 
         data = self.json_body(req)
-        service.create_node(chain_id, data)
+        if isinstance(data, list):
+            result = service.create_nodes(chain_id, data)
+        else:
+            result = service.create_node(chain_id, data)
 
         resp.status = falcon.HTTP_202
+        resp.data = result
 
     def on_get(self, req, resp, chain_id):
         result = service.get_nodes(chain_id)
@@ -0,0 +1,88 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Ethereum accounts derived from a seed
+
+The accounts are funded in the genesis of the chains catena creates and used
+to generate load (see catena.service.benchmarks). Deriving them only needs
+the public key, so secp256k1 is implemented here instead of adding a
+dependency for it.
+"""
+
+import binascii
+
+from Crypto.Hash import keccak
+
+# secp256k1 domain parameters
+_P = 2 ** 256 - 2 ** 32 - 977
+_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+_G = (0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+      0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8)
+
+
+def _add(p, q):
+    if p is None:
+        return q
+    if q is None:
+        return p
+    if p[0] == q[0] and (p[1] + q[1]) % _P == 0:
+        return None
+
+    if p == q:
+        slope = 3 * p[0] * p[0] * pow(2 * p[1], _P - 2, _P)
+    else:
+        slope = (q[1] - p[1]) * pow(q[0] - p[0], _P - 2, _P)
+    slope %= _P
+
+    x = (slope * slope - p[0] - q[0]) % _P
+    return x, (slope * (p[0] - x) - p[1]) % _P
+
+
+def _multiply(k, point=_G):
+    result = None
+    while k:
+        if k & 1:
+            result = _add(result, point)
+        point = _add(point, point)
+        k >>= 1
+    return result
+
+
+def _keccak(data):
+    return keccak.new(digest_bits=256, data=data).hexdigest()
+
+
+def private_key_to_address(private_key):
+    """Returns the address of a hex encoded private key"""
+    x, y = _multiply(int(private_key, 16))
+    public_key = binascii.unhexlify('{:064x}{:064x}'.format(x, y))
+    return '0x' + _keccak(public_key)[-40:]
+
+
+def derive_private_key(seed, index):
+    """Derives the index-th hex encoded private key of a hex encoded seed"""
+    digest = _keccak(binascii.unhexlify(seed) + '{:08x}'.format(
+        index).encode('ascii'))
+    return '{:064x}'.format(int(digest, 16) % (_N - 1) + 1)
+
+
+def derive_accounts(seed, count):
+    """Returns (private key, address) of the first count accounts"""
+    accounts = []
+    for index in range(count):
+        private_key = derive_private_key(seed, index)
+        accounts.append((private_key, private_key_to_address(private_key)))
+    return accounts
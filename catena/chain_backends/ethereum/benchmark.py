@@ -0,0 +1,174 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Transaction load generator measuring what a chain sustains
+"""
+
+import math
+import threading
+import time
+
+import futurist
+from oslo_config import cfg
+from oslo_log import log
+
+CONF = cfg.CONF
+LOG = log.getLogger(__name__)
+
+# Seconds between two polls for new blocks
+BLOCK_POLL_INTERVAL = 0.5
+
+# Gas of a plain value transfer
+TRANSFER_GAS = '0x5208'
+
+
+def _percentile(values, percent):
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return None
+    rank = int(math.ceil(percent / 100.0 * len(values)))
+    return values[max(rank, 1) - 1]
+
+
+class _BlockWatcher(threading.Thread):
+    """Records when every transaction was first seen in a block"""
+
+    def __init__(self, rpc, start_block):
+        super(_BlockWatcher, self).__init__()
+        self.daemon = True
+        self.rpc = rpc
+        self.next_block = start_block + 1
+        self.included = {}
+        self.blocks = 0
+        self.uncles = 0
+        self.error = None
+        self._finished = threading.Event()
+
+    def stop(self):
+        self._finished.set()
+
+    def run(self):
+        try:
+            while not self._finished.is_set():
+                head = int(self.rpc.call('eth_blockNumber'), 16)
+                while self.next_block <= head:
+                    self._record(self.next_block)
+                    self.next_block += 1
+                self._finished.wait(BLOCK_POLL_INTERVAL)
+        except Exception as e:
+            LOG.exception("Watching blocks failed")
+            self.error = e
+
+    def _record(self, number):
+        block = self.rpc.call('eth_getBlockByNumber',
+                              '0x{:x}'.format(number), False)
+        seen = time.time()
+        self.blocks += 1
+        self.uncles += len(block['uncles'])
+        for tx_hash in block['transactions']:
+            self.included[tx_hash] = seen
+
+
+def run_load(rpc, addresses, rate, duration, timeout):
+    """Sends value transfers between the unlocked accounts at a target rate
+
+    The transfers are sent round robin from every account to the next one
+    for duration seconds. Afterwards, the blocks are watched for up to
+    timeout seconds until all transfers are included. Returns the
+    throughput, the inclusion latency percentiles and the uncle rate.
+    """
+    start_block = int(rpc.call('eth_blockNumber'), 16)
+    watcher = _BlockWatcher(rpc, start_block)
+    watcher.start()
+
+    sent = {}
+    failed = []
+    lock = threading.Lock()
+
+    def send(index, sent_at):
+        transaction = {
+            'from': addresses[index % len(addresses)],
+            'to': addresses[(index + 1) % len(addresses)],
+            'value': '0x1',
+            'gas': TRANSFER_GAS
+        }
+        try:
+            tx_hash = rpc.call('eth_sendTransaction', transaction)
+        except Exception as e:
+            with lock:
+                failed.append(str(e))
+        else:
+            with lock:
+                sent[tx_hash] = sent_at
+
+    total = int(rate * duration)
+    LOG.info("Sending {} transactions at {}/s".format(total, rate))
+
+    start = time.time()
+    try:
+        with futurist.ThreadPoolExecutor(
+                max_workers=CONF.benchmark.senders) as executor:
+            for index in range(total):
+                delay = start + index / float(rate) - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(send, index, time.time())
+        send_duration = time.time() - start
+
+        deadline = time.time() + timeout
+        while time.time() < deadline and watcher.error is None:
+            if all(tx_hash in watcher.included for tx_hash in list(sent)):
+                break
+            time.sleep(BLOCK_POLL_INTERVAL)
+    finally:
+        watcher.stop()
+        watcher.join()
+
+    if watcher.error is not None:
+        raise watcher.error
+
+    latencies = sorted(watcher.included[tx_hash] - sent_at
+                       for tx_hash, sent_at in sent.items()
+                       if tx_hash in watcher.included)
+    if latencies:
+        last_included = max(watcher.included[tx_hash] for tx_hash in sent
+                            if tx_hash in watcher.included)
+        tps = len(latencies) / (last_included - start)
+    else:
+        tps = 0.0
+
+    if failed:
+        LOG.warning("{} transactions could not be sent, e.g. {}".format(
+            len(failed), failed[0]))
+
+    return {
+        'sent': len(sent),
+        'failed': len(failed),
+        'included': len(latencies),
+        'send_rate': len(sent) / send_duration if send_duration else 0.0,
+        'tps': tps,
+        'latency': {
+            'p50': _percentile(latencies, 50),
+            'p90': _percentile(latencies, 90),
+            'p99': _percentile(latencies, 99),
+            'max': latencies[-1] if latencies else None
+        },
+        'blocks': watcher.blocks,
+        'uncle_rate': (float(watcher.uncles) / watcher.blocks
+                       if watcher.blocks else 0.0),
+        'start_block': start_block,
+        'end_block': watcher.next_block - 1
+    }
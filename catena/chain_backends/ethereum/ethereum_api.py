@@ -13,21 +13,46 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import binascii
+import hashlib
 import json
 import os
 import random
 import string
 import sys
 import tempfile
+import time
 
+from oslo_config import cfg
 from oslo_log import log
 
+from catena.chain_backends.ethereum import accounts
 from catena.common import ansible_utils
-from catena.common.utils import decrypt_private_rsakey
+from catena.common import ssh_utils
 
-CHAIN_TYPES = ['proof-of-work']
+CHAIN_TYPES = ['proof-of-work', 'proof-of-authority']
 NODE_TYPES = ['miner']
 
+# Data directory of geth on the nodes, see the deploy playbooks
+GETH_DIR = '/root/.ethereum/geth'
+GETH_IPC = '/root/.ethereum/geth.ipc'
+SIGNER_PASSWORD_FILE = '/root/.ethereum/signer.pass'
+
+# geth serves JSON-RPC on this port of the nodes' loopback interface
+RPC_PORT = 8545
+
+# Initial balance (in wei) of every benchmark account
+BENCHMARK_BALANCE = '0x{:x}'.format(10 ** 24)
+
+# geth settings derived from the flavour of a node, users can override them
+# per node. The names are those of the geth flags.
+GETH_TUNING = ('cache', 'maxpeers', 'minerthreads', 'txpool.globalslots',
+               'txpool.globalqueue')
+
+# Number of blocks after which clique checkpoints the signers
+CLIQUE_EPOCH = 30000
+
+CONF = cfg.CONF
 LOG = log.getLogger(__name__)
 
 
@@ -37,8 +62,9 @@ def initialize_chain(chain):
     assert (chain_config['type'] in CHAIN_TYPES) or (
         chain_config.get('network_id', None) and chain_config.get('genesis',
                                                                   None))
-    assert len(
-        chain_config['mining_account']) > 0, "Must specify a mining account"
+    if chain_config.get('type') == 'proof-of-work':
+        assert len(chain_config['mining_account']) > 0, \
+            "Must specify a mining account"
 
     # Only assign network_id and genesis if they are not already provided by
     #  the user (i.e. to connect to an existing blockchain)
@@ -79,10 +105,41 @@ def initialize_chain(chain):
                 "extraData": "0x11bbe8db4e347b4e8c937c1c8370e4b5ed33adb3db69cbdb7a38e1e50b1b82fa",  # noqa
                 "gasLimit": "0x4c4b40"
                 }
+        elif chain_config['type'] == 'proof-of-authority':
+            chain_config['genesis'] = {
+                "alloc": {},
+                "config": {
+                    # See above
+                    "chainId": chain_config['network_id'],
+                    "homesteadBlock": 0,
+                    "eip150Block": 0,
+                    "eip155Block": 0,
+                    "eip158Block": 0,
+                    "clique": {
+                        "period": int(chain_config.get(
+                            'block_period', CONF.ethereum.block_period)),
+                        "epoch": CLIQUE_EPOCH
+                    }
+                },
+                "nonce": "0x0",
+                "difficulty": "0x1",
+                "mixhash": "0x0000000000000000000000000000000000000000000000000000000000000000",  # noqa
+                "coinbase": "0x0000000000000000000000000000000000000000",
+                "timestamp": "0x00",
+                "parentHash": "0x0000000000000000000000000000000000000000000000000000000000000000",  # noqa
+                # The controller is the initial signer, see
+                # set_initial_signers
+                "extraData": _clique_extra_data([]),
+                "gasLimit": "0x{:x}".format(int(chain_config.get(
+                    'gas_limit', CONF.ethereum.gas_limit)))
+                }
+            chain_config['signers'] = []
         else:
             raise Exception('Unkown chain type for ethereum: {}'.format(
                 chain_config['type']))
 
+        _fund_benchmark_accounts(chain, chain_config)
+
     chain_config['stats_secret'] = ''.join(
         random.choice(string.ascii_lowercase + string.digits) for _ in
         range(16))
@@ -90,136 +147,448 @@ def initialize_chain(chain):
     chain.set_chain_config(chain_config)
 
 
-def _write_genesis(node, file):
+def _fund_benchmark_accounts(chain, chain_config):
+    """Allocates ether to the accounts used to benchmark a new chain
+
+    Only the seed of the accounts is kept, in the cloud config which isn't
+    exposed by the API.
+    """
+    if CONF.benchmark.accounts <= 0:
+        return
+
+    seed = binascii.hexlify(os.urandom(32)).decode('ascii')
+    for _, address in accounts.derive_accounts(seed,
+                                               CONF.benchmark.accounts):
+        chain_config['genesis']['alloc'][address[2:]] = {
+            'balance': BENCHMARK_BALANCE}
+    chain_config['benchmark_accounts'] = CONF.benchmark.accounts
+
+    cloud_config = chain.get_cloud_config()
+    cloud_config['benchmark_seed'] = seed
+    chain.set_cloud_config(cloud_config)
+
+
+def get_benchmark_accounts(chain):
+    """Returns (private key, address) of the chain's prefunded accounts"""
+    count = chain.get_chain_config().get('benchmark_accounts')
+    if not count:
+        raise Exception("Chain {} has no benchmark accounts, only chains "
+                        "created with a generated genesis have them".format(
+                            chain.id))
+    seed = chain.get_cloud_config()['benchmark_seed']
+    return accounts.derive_accounts(seed, count)
+
+
+def _run_geth_script(chain, node, script):
+    # The script is passed on stdin to keep keys off the command line
+    cloud_config = chain.get_cloud_config()
+    command = ("sudo geth attach ipc:{} "
+               "--exec 'loadScript(\"/dev/stdin\")'").format(GETH_IPC)
+
+    with ssh_utils.private_key_files(
+            node.ssh_key, cloud_config['jumpbox_key']) as key_files:
+        node_key_file, jumpbox_key_file = key_files
+        ssh_utils.run(node.ip, node_key_file, cloud_config['jumpbox_ip'],
+                      jumpbox_key_file, command, input=script)
+
+
+def unlock_accounts(chain, node, benchmark_accounts, duration):
+    """Imports the benchmark accounts into a node's geth and unlocks them
+
+    geth then signs the transactions sent from these accounts over
+    JSON-RPC until duration seconds have passed or lock_accounts is called.
+    """
+    password = hashlib.sha256(
+        chain.get_cloud_config()['benchmark_seed'].encode(
+            'ascii')).hexdigest()
+
+    script = ''.join(
+        'try {{ personal.importRawKey("{0}", "{2}"); }} catch (e) {{}}\n'
+        'personal.unlockAccount("{1}", "{2}", {3});\n'.format(
+            private_key, address, password, int(duration))
+        for private_key, address in benchmark_accounts)
+    _run_geth_script(chain, node, script)
+
+
+def lock_accounts(chain, node, benchmark_accounts):
+    """Locks the benchmark accounts unlocked by unlock_accounts"""
+    script = ''.join('personal.lockAccount("{}");\n'.format(address)
+                     for _, address in benchmark_accounts)
+    _run_geth_script(chain, node, script)
+
+
+def _clique_extra_data(signers):
+    # 32 bytes of vanity, the signer addresses and 65 bytes for the seal
+    return '0x' + '00' * 32 + ''.join(
+        signer[2:].lower() for signer in signers) + '00' * 65
+
+
+def uses_signers(chain):
+    return chain.get_chain_config().get('type') == 'proof-of-authority'
+
+
+def needs_initial_signer(chain):
+    """Returns whether the genesis still lacks its signers
+
+    This is only the case for proof-of-authority genesis files catena
+    created itself.
+    """
+    return chain.get_chain_config().get('signers') == []
+
+
+def set_initial_signers(chain, signers):
+    chain_config = chain.get_chain_config()
+    chain_config['genesis']['extraData'] = _clique_extra_data(signers)
+    chain_config['signers'] = signers
+    chain.set_chain_config(chain_config)
+
+
+def _write_genesis(chain, file):
     LOG.debug("Write genesis file to {}".format(file.name))
-    genesis_json = node.chain.get_chain_config()['genesis']
+    genesis_json = chain.get_chain_config()['genesis']
     json.dump(genesis_json, file)
     file.flush()
 
 
-def generate_ansible_config(provider_config, cloud_config, chain_config):
-    config = {
-        "network_id": chain_config['network_id'],
-        "stats_secret": chain_config['stats_secret'],
-        }
-
+def _proxy_env(provider_config):
     if "proxy" in provider_config:
-        config["proxy_env"] = {
+        return {
             "http_proxy": provider_config["proxy"],
             "https_proxy": provider_config["proxy"],
             "ftp_proxy": provider_config["proxy"],
             "no_proxy": "localhost,127.0.0.1"
             }
     else:
-        config["proxy_env"] = {}
+        return {}
+
+
+def generate_ansible_config(provider_config, cloud_config, chain_config):
+    config = {
+        "network_id": chain_config['network_id'],
+        "stats_secret": chain_config['stats_secret'],
+        "proxy_env": _proxy_env(provider_config),
+        "golden_image": provider_config.get('golden_image', False),
+        "signer": chain_config.get('type') == 'proof-of-authority',
+        "signer_password_file": SIGNER_PASSWORD_FILE,
+        "rpc_port": RPC_PORT
+        }
 
     return config
 
 
-def provision_controller(chain, node, jumpbox_ip):
-    chain_config = chain.get_chain_config()
+def validate_geth_overrides(overrides):
+    if overrides is None:
+        return
+    assert isinstance(overrides, dict), "geth settings must be an object"
+    for key, value in overrides.items():
+        assert key in GETH_TUNING, "Unknown geth setting: {}".format(key)
+        # bool is a subclass of int, but true is not a setting
+        assert (isinstance(value, int) and not isinstance(value, bool) and
+                value >= 0), \
+            "geth setting {} must be a non-negative integer".format(key)
+
+
+def geth_tuning(chain, node, flavour_details):
+    """Derives the geth settings of a node from its vCPUs and memory
+
+    flavour_details maps flavour names to their vCPUs and memory (in MB).
+    Settings of unknown flavours are left at geth's defaults. The overrides
+    in the node's chain config take precedence.
+    """
+    tuning = {}
+
+    details = flavour_details.get(node.flavour)
+    if details:
+        vcpus, memory = details['vcpus'], details['memory']
+        # A quarter of the memory for the database cache leaves room for
+        # the OS page cache and the transaction pool
+        tuning['cache'] = max(128, min(memory // 4, 16384))
+        tuning['maxpeers'] = max(25, min(vcpus * 12, 100))
+        tuning['txpool.globalslots'] = max(4096, min(memory, 65536))
+        tuning['txpool.globalqueue'] = max(1024, min(memory // 4, 16384))
+        if chain.get_chain_config().get('type') == 'proof-of-work':
+            # One core is kept free for block processing
+            tuning['minerthreads'] = max(1, vcpus - 1)
+
+    tuning.update(node.get_chain_config().get('geth') or {})
+    return tuning
+
+
+def _geth_args(tuning):
+    return ' '.join('--{} {}'.format(key, value)
+                    for key, value in sorted(tuning.items()))
+
+
+def _provision(chain, nodes, playbook, config, jumpbox_ip,
+               flavour_details=None):
+    """Runs a playbook against all nodes at once
+
+    Returns the results the playbook reported for every node by node id.
+    """
     cloud_config = chain.get_cloud_config()
-    provider_config = chain.cloud.get_cloud_config()
+    host_vars = dict(
+        (node.ip, {'geth_args': _geth_args(
+            geth_tuning(chain, node, flavour_details or {}))})
+        for node in nodes)
 
     dir_path = os.path.dirname(os.path.realpath(__file__))
-    playbook_path = os.path.join(dir_path, 'ansible', 'deploy-controller.yml')
-    node_id_file = os.path.join('/tmp', 'ansible_node_id_' + node.id)
-
-    config = generate_ansible_config(provider_config, cloud_config,
-                                     chain_config)
+    playbook_path = os.path.join(dir_path, 'ansible', playbook)
 
     with tempfile.NamedTemporaryFile() as temp_genesis:
-        _write_genesis(node, temp_genesis)
+        _write_genesis(chain, temp_genesis)
 
-        home = os.path.expanduser("~/.ssh")
+        encrypted_keys = [node.ssh_key for node in nodes]
+        encrypted_keys.append(cloud_config['jumpbox_key'])
 
-        # We can assume that this is safe because Python makes use of O_EXCL:
-        # https://docs.python.org/2/library/tempfile.html#tempfile.mkstemp
-        with tempfile.NamedTemporaryFile(dir=home) as temp_node_ssh, \
-                tempfile.NamedTemporaryFile(dir=home) as temp_jumpbox_ssh:
-            node.get_ssh_key(temp_node_ssh)
-            decrypt_private_rsakey(cloud_config['jumpbox_key'],
-                                   temp_jumpbox_ssh)
+        with ssh_utils.private_key_files(*encrypted_keys) as key_files:
+            jumpbox_key_file = key_files.pop()
+            host_keys = dict(zip([node.ip for node in nodes], key_files))
             LOG.debug(
-                "Writing node key to {}. Writing jumbox key to {}".format(
-                    temp_node_ssh.name, temp_jumpbox_ssh.name))
+                "Writing node keys to {}. Writing jumbox key to "
+                "{}".format(", ".join(key_files), jumpbox_key_file))
 
             config["genesis_file"] = temp_genesis.name
-            config["node_id_file"] = node_id_file
 
-            ansible_utils.launch_playbook(playbook_path, temp_node_ssh.name,
-                                          [node.ip], config, jumpbox_ip,
-                                          temp_jumpbox_ssh.name)
-    try:
-        with open(node_id_file, 'r') as node_id:
-            return node_id.read()
-    finally:
-        os.unlink(node_id_file)
+            run = ansible_utils.launch_playbook(playbook_path, host_keys,
+                                                config, jumpbox_ip,
+                                                jumpbox_key_file, host_vars)
+
+    return dict((node.id, run.results[node.ip]) for node in nodes)
 
 
-def _get_bootnodes(chain):
+def provision_controller(chain, node, jumpbox_ip, flavour_details=None):
     chain_config = chain.get_chain_config()
-    bootnodes = chain_config.get('external_bootnodes', [])
-    if bootnodes is None:
-        bootnodes = []
+    cloud_config = chain.get_cloud_config()
+    provider_config = chain.cloud.get_cloud_config()
 
-    for node in chain.nodes:
-        node_chain_config = node.get_chain_config()
+    config = generate_ansible_config(provider_config, cloud_config,
+                                     chain_config)
 
-        if 'eth_node_id' in node_chain_config:  # Nodes that are currently
-            # provisioned may not have a enode id yet
-            bootnodes.append(
-                'enode://{}@{}:30303'.format(node_chain_config['eth_node_id'],
-                                             node.ip))
+    return _provision(chain, [node], 'deploy-controller.yml', config,
+                      jumpbox_ip, flavour_details)[node.id]
 
-    return ",".join(bootnodes)
 
+def create_signer(chain, node, jumpbox_ip):
+    """Creates the signer account of a node and returns its address
 
-def provision_node(chain, node, jumpbox_ip, controller_ip):
-    chain_config = chain.get_chain_config()
+    geth is installed first, the node is provisioned after the genesis
+    naming its signer has been written.
+    """
     cloud_config = chain.get_cloud_config()
     provider_config = chain.cloud.get_cloud_config()
+    config = {
+        "proxy_env": _proxy_env(provider_config),
+        "golden_image": provider_config.get('golden_image', False),
+        "signer_password_file": SIGNER_PASSWORD_FILE
+        }
+
+    run = _provision_vm('create-signer.yml', config, node.ip, node.ssh_key,
+                        jumpbox_ip, cloud_config['jumpbox_key'])
+    return run.results[node.ip]['signer']
+
 
+def propose_signers(chain, voters, signers, authorize):
+    """Votes for adding (or removing) signers on the given signer nodes
+
+    Clique only changes a signer once the majority of signers voted for it,
+    so the vote is cast on all voters. Returns the voters that couldn't
+    vote.
+    """
+    cloud_config = chain.get_cloud_config()
+    script = '; '.join('clique.propose("{}", {})'.format(
+        signer, 'true' if authorize else 'false') for signer in signers)
+    command = "sudo geth attach ipc:{} --exec '{}'".format(GETH_IPC, script)
+
+    failed = []
+    for voter in voters:
+        try:
+            with ssh_utils.private_key_files(
+                    voter.ssh_key, cloud_config['jumpbox_key']) as key_files:
+                voter_key_file, jumpbox_key_file = key_files
+                ssh_utils.run(voter.ip, voter_key_file,
+                              cloud_config['jumpbox_ip'], jumpbox_key_file,
+                              command)
+        except Exception as e:
+            LOG.warning("Node {} could not vote on signers {}: {}".format(
+                voter.id, ", ".join(signers), e))
+            failed.append(voter)
+    return failed
+
+
+def get_signers(chain, node):
+    """Returns the current signers of a chain as seen by one of its nodes"""
+    cloud_config = chain.get_cloud_config()
+    command = ("sudo geth attach ipc:{} "
+               "--exec 'JSON.stringify(clique.getSigners())'").format(GETH_IPC)
+
+    with ssh_utils.private_key_files(
+            node.ssh_key, cloud_config['jumpbox_key']) as key_files:
+        node_key_file, jumpbox_key_file = key_files
+        output = ssh_utils.run(node.ip, node_key_file,
+                               cloud_config['jumpbox_ip'], jumpbox_key_file,
+                               command)
+
+    # The console prints the string returned by the script as a JSON string
+    signers = json.loads(output)
+    if not isinstance(signers, list):
+        signers = json.loads(signers)
+    return [signer.lower() for signer in signers]
+
+
+def wait_for_signers(chain, node, signers, authorized):
+    """Waits until the signers have been added (or removed) on a node
+
+    Raises once ethereum.signer_vote_timeout has passed.
+    """
+    signers = [signer.lower() for signer in signers]
+    deadline = time.time() + CONF.ethereum.signer_vote_timeout
+    # Votes are only counted in new blocks
+    clique = chain.get_chain_config()['genesis']['config'].get('clique', {})
+    interval = max(1, clique.get('period', CONF.ethereum.block_period))
+
+    while True:
+        current = get_signers(chain, node)
+        if all((signer in current) == authorized for signer in signers):
+            return
+
+        if time.time() + interval > deadline:
+            raise Exception('The votes on signers {} of chain {} did not '
+                            'pass within {} seconds'.format(
+                                ", ".join(signers), chain.id,
+                                CONF.ethereum.signer_vote_timeout))
+        time.sleep(interval)
+
+
+def _provision_vm(playbook, config, ip, ssh_key, jumpbox_ip, jumpbox_key):
+    """Runs a playbook against a single VM"""
     dir_path = os.path.dirname(os.path.realpath(__file__))
-    playbook_path = os.path.join(dir_path, 'ansible', 'deploy-geth.yml')
-    node_id_file = os.path.join('/tmp', 'ansible_node_id_' + node.id)
-    bootnodes = _get_bootnodes(chain)
+    playbook_path = os.path.join(dir_path, 'ansible', playbook)
+
+    with ssh_utils.private_key_files(ssh_key, jumpbox_key) as key_files:
+        node_key_file, jumpbox_key_file = key_files
+        return ansible_utils.launch_playbook(playbook_path,
+                                             {ip: node_key_file}, config,
+                                             jumpbox_ip, jumpbox_key_file)
+
+
+def prepare_node(provider_config, ip, ssh_key, jumpbox_ip, jumpbox_key):
+    """Installs everything a node needs independent of its chain
+
+    This is used for the VMs of the warm pool, provisioning them later on
+    skips these steps.
+    """
+    config = {
+        "proxy_env": _proxy_env(provider_config),
+        "golden_image": provider_config.get('golden_image', False)
+        }
+    _provision_vm('prepare-node.yml', config, ip, ssh_key, jumpbox_ip,
+                  jumpbox_key)
+
+
+def build_image(provider_config, ip, ssh_key, jumpbox_ip, jumpbox_key,
+                deprovision_agent=False):
+    """Installs the packages of all node types on a VM to be snapshotted"""
+    config = {
+        "proxy_env": _proxy_env(provider_config),
+        "deprovision_agent": deprovision_agent
+        }
+    _provision_vm('build-image.yml', config, ip, ssh_key, jumpbox_ip,
+                  jumpbox_key)
+
+
+def enode_url(eth_node_id, ip):
+    return 'enode://{}@{}:30303'.format(eth_node_id, ip)
+
+
+def _get_bootnodes(chain, enodes):
+    """Picks a random subset of the chain's enodes as bootnodes
+
+    Every node only needs a few bootnodes to discover the rest of the
+    network, picking them randomly spreads the load of new nodes.
+    """
+    chain_config = chain.get_chain_config()
+    bootnodes = list(chain_config.get('external_bootnodes') or [])
+
+    count = min(len(enodes), CONF.ethereum.max_bootnodes)
+    bootnodes.extend(random.sample(enodes, count))
+
+    return ",".join(bootnodes)
+
+
+def provision_nodes(chain, nodes, jumpbox_ip, controller_ip, enodes,
+                    flavour_details=None):
+    """Provisions several nodes with a single ansible run
+
+    enodes are the enode URLs of the chain's provisioned nodes,
+    flavour_details are used to tune geth (see geth_tuning). Returns the
+    results the playbook reported (the ethereum node id and the signer
+    address) for every node by node id.
+    """
+    chain_config = chain.get_chain_config()
+    cloud_config = chain.get_cloud_config()
+    provider_config = chain.cloud.get_cloud_config()
 
     config = generate_ansible_config(provider_config, cloud_config,
                                      chain_config)
+    config["stats_ip"] = controller_ip
+    config["bootnodes"] = _get_bootnodes(chain, enodes)
+    config["etherbase"] = chain_config.get('mining_account')
 
-    with tempfile.NamedTemporaryFile() as temp_genesis:
-        _write_genesis(node, temp_genesis)
-
-        home = os.path.expanduser("~/.ssh")
-
-        # We can assume that this is safe because Python makes use of O_EXCL:
-        # https://docs.python.org/2/library/tempfile.html#tempfile.mkstemp
-        with tempfile.NamedTemporaryFile(
-                dir=home) as temp_node_ssh, tempfile.NamedTemporaryFile(
-            dir=home) as temp_jumpbox_ssh:
-            node.get_ssh_key(temp_node_ssh)
-            decrypt_private_rsakey(cloud_config['jumpbox_key'],
-                                   temp_jumpbox_ssh)
-            LOG.debug(
-                "Writing node key to {}. Writing jumbox key to {}".format(
-                    temp_node_ssh.name, temp_jumpbox_ssh.name))
+    return _provision(chain, nodes, 'deploy-geth.yml', config, jumpbox_ip,
+                      flavour_details)
 
-            config["genesis_file"] = temp_genesis.name
-            config["node_id_file"] = node_id_file
-            config["stats_ip"] = controller_ip
-            config["bootnodes"] = bootnodes
-            config["etherbase"] = chain_config['mining_account']
-
-            ansible_utils.launch_playbook(playbook_path, temp_node_ssh.name,
-                                          [node.ip], config, jumpbox_ip,
-                                          temp_jumpbox_ssh.name)
-
-    try:
-        with open(node_id_file, 'r') as node_id:
-            return node_id.read()
-    finally:
-        os.unlink(node_id_file)
+
+def provision_node(chain, node, jumpbox_ip, controller_ip, enodes,
+                   flavour_details=None):
+    return provision_nodes(chain, [node], jumpbox_ip, controller_ip,
+                           enodes, flavour_details)[node.id]
+
+
+def snapshot_export_command():
+    """Returns the command writing a chaindata archive of a node to stdout
+
+    geth is stopped while the archive is written, so that the database is
+    consistent. Snapshots are therefore taken from a node the chain can do
+    without for a while, see catena.service.snapshots.
+    """
+    return ('sudo systemctl stop geth >/dev/null 2>&1; '
+            'sudo tar -C {} -czf - chaindata; status=$?; '
+            'sudo systemctl start geth >/dev/null 2>&1; '
+            'exit $status').format(GETH_DIR)
+
+
+def snapshot_import_command():
+    """Returns the command replacing a node's chaindata with stdin
+
+    The archive is extracted next to the chaindata first, so that an
+    interrupted transfer leaves the node's chaindata untouched.
+    """
+    return ('sudo systemctl stop geth >/dev/null 2>&1; '
+            'sudo rm -rf {0}/seed && sudo mkdir -p {0}/seed && '
+            'sudo tar -C {0}/seed -xzf - && '
+            'sudo rm -rf {0}/chaindata && '
+            'sudo mv {0}/seed/chaindata {0}/chaindata && '
+            'sudo rmdir {0}/seed').format(GETH_DIR)
+
+
+def block_number_command():
+    return 'sudo geth attach ipc:{} --exec eth.blockNumber'.format(GETH_IPC)
+
+
+def node_status_command():
+    """Returns the command printing a node's status as JSON"""
+    script = ('JSON.stringify({block: eth.blockNumber, peers: net.peerCount, '
+              'pending: txpool.status.pending, '
+              'syncing: eth.syncing !== false})')
+    return "sudo geth attach ipc:{} --exec '{}'".format(GETH_IPC, script)
+
+
+def parse_node_status(output):
+    # The console prints the string returned by the script as a JSON string
+    status = json.loads(output)
+    if not isinstance(status, dict):
+        status = json.loads(status)
+    return status
 
 
 def get_backend_info():
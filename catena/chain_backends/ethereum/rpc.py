@@ -0,0 +1,57 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import itertools
+import threading
+
+import requests
+
+
+class RpcError(Exception):
+    pass
+
+
+class RpcClient(object):
+    """Minimal geth JSON-RPC client over HTTP
+
+    Connections are kept alive per thread, so a client can be shared by
+    several threads.
+    """
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+
+    def _session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def call(self, method, *params):
+        response = self._session().post(self.url, json={
+            'jsonrpc': '2.0',
+            'id': next(self._ids),
+            'method': method,
+            'params': list(params)
+        }, timeout=self.timeout)
+        response.raise_for_status()
+
+        body = response.json()
+        if 'error' in body:
+            raise RpcError('{}: {}'.format(method,
+                                           body['error'].get('message')))
+        return body['result']
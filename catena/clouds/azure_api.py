@@ -13,15 +13,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
 import uuid
 
 from azure.mgmt.compute import ComputeManagementClient
 from azure.mgmt.network import NetworkManagementClient
 from azure.mgmt.resource import ResourceManagementClient
 from msrestazure.azure_active_directory import ServicePrincipalCredentials
+from msrestazure.azure_exceptions import CloudError
 from oslo_config import cfg
 from oslo_log import log
 
+from catena.clouds.catalog import CATALOG
 from catena.common.utils import encrypt_private_rsakey
 
 LOG = log.getLogger(__name__)
@@ -34,7 +37,10 @@ class Azure(object):
         return str(uuid.uuid4())
 
     def __init__(self, cloud):
-        self.cloud = cloud
+        # Clients are shared between threads (and sessions), so they only
+        # keep copies of the model's data
+        self.cloud_id = cloud.id
+        self.provider_config = copy.deepcopy(cloud.get_cloud_config())
         self.authentication = cloud.get_authentication()
 
         self.location = self.authentication['location']
@@ -68,6 +74,19 @@ class Azure(object):
 
         return result
 
+    def get_flavour_details(self):
+        """Returns the vCPUs and memory (in MB) of every flavour by name"""
+        LOG.debug("Getting node flavour details")
+
+        result = {}
+
+        for flavor in self.compute_client.virtual_machine_sizes.list(
+                self.location):
+            result[flavor.name] = {'vcpus': flavor.number_of_cores,
+                                   'memory': flavor.memory_in_mb}
+
+        return result
+
     def get_networks(self):
         LOG.debug("Getting networks")
 
@@ -92,7 +111,7 @@ class Azure(object):
     def create_vm_parameters(self, name, flavour, public_key, nic_id):
         """Create the VM parameters structure.
         """
-        provider_config = self.cloud.get_cloud_config()
+        provider_config = self.provider_config
         return {
             'location': self.location,
             'os_profile': {
@@ -122,7 +141,7 @@ class Azure(object):
             },
         }
 
-    def add_node(self, public_key, flavour_name, name, chain):
+    def create_server(self, public_key, flavour_name, name, chain):
         cloud_config = chain.get_cloud_config()
 
         LOG.debug("Creating server")
@@ -162,14 +181,23 @@ class Azure(object):
                 vm_parameters
             )
         async_vm_creation.wait()
+        CATALOG.invalidate(self.cloud_id, 'instances')
+
+        return name
 
-        vm = async_vm_creation.result()
+    def wait_for_ip(self, chain, id):
+        cloud_config = chain.get_cloud_config()
+
+        network_name = cloud_config['network']
+        resource_group = network_name.split("/")[0]
+
+        vm = self.compute_client.virtual_machines.get(resource_group, id)
         nic = self.network_client.network_interfaces.get(
             resource_group,
             vm.network_profile.network_interfaces[0].id.split('/')[-1]
         )
 
-        return name, nic.ip_configurations[0].private_ip_address
+        return nic.ip_configurations[0].private_ip_address
 
     def delete_node(self, chain, id):
         cloud_config = chain.get_cloud_config()
@@ -177,7 +205,13 @@ class Azure(object):
         network_name = cloud_config['network']
         resource_group = network_name.split("/")[0]
 
-        vm = self.compute_client.virtual_machines.get(resource_group, id)
+        try:
+            vm = self.compute_client.virtual_machines.get(resource_group, id)
+        except CloudError as e:
+            if e.status_code == 404:
+                LOG.debug("Server {} is already deleted".format(id))
+                return
+            raise
         disk_name = vm.storage_profile.os_disk.name
         nic_name = vm.network_profile.network_interfaces[0].id.split('/')[-1]
 
@@ -185,8 +219,42 @@ class Azure(object):
             resource_group,
             vm.name
         ).wait()
-        self.compute_client.disks.delete(resource_group, disk_name)
-        self.network_client.network_interfaces.delete(resource_group, nic_name)
+        CATALOG.invalidate(self.cloud_id, 'instances')
+
+        # The disk and the NIC are independent of each other, so both
+        # long-running operations are started before waiting for either
+        async_disk_deletion = self.compute_client.disks.delete(
+            resource_group, disk_name)
+        async_nic_deletion = self.network_client.network_interfaces.delete(
+            resource_group, nic_name)
+        async_disk_deletion.wait()
+        async_nic_deletion.wait()
+
+    def create_image(self, chain, id, name):
+        """Snapshots a VM and returns the provider config to boot it
+
+        The VM can't be started again afterwards.
+        """
+        cloud_config = chain.get_cloud_config()
+
+        network_name = cloud_config['network']
+        resource_group = network_name.split("/")[0]
+
+        self.compute_client.virtual_machines.deallocate(
+            resource_group, id).wait()
+        self.compute_client.virtual_machines.generalize(resource_group, id)
+        vm = self.compute_client.virtual_machines.get(resource_group, id)
+
+        image = self.compute_client.images.create_or_update(
+            resource_group,
+            name,
+            {
+                'location': self.location,
+                'source_virtual_machine': {'id': vm.id}
+            }
+        ).result()
+
+        return {'image': {'id': image.id}}
 
     def initialize_cloud(self, chain):
         cloud_config = chain.get_cloud_config()
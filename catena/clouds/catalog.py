@@ -0,0 +1,120 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+from oslo_config import cfg
+from oslo_log import log
+
+CONF = cfg.CONF
+LOG = log.getLogger(__name__)
+
+KINDS = ('flavours', 'flavour_details', 'networks', 'instances')
+
+# Kinds that are cached for as long as another kind
+TTL_KINDS = {'flavour_details': 'flavours'}
+
+
+class CatalogCache(object):
+    """Caches the catalog listings (flavours, networks, instances) of clouds
+
+    An entry is fresh for the configured TTL of its kind. Once it is older
+    than catalog_refresh_ahead * TTL a background refresh is started, and
+    until it is older than TTL + catalog_stale_ttl the old value is served
+    while the refresh runs (stale-while-revalidate). Only older entries are
+    loaded synchronously.
+
+    Every API process has its own cache and invalidate() only affects the
+    calling process. Other processes may serve a listing for up to TTL +
+    catalog_stale_ttl after it changed. Entries are stored with a version
+    of the cloud's credentials, an entry of another version is never
+    served.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._generations = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _ttl(kind):
+        return getattr(CONF.clouds, '{}_ttl'.format(
+            TTL_KINDS.get(kind, kind)))
+
+    def get(self, cloud_id, kind, loader, version=None):
+        key = (cloud_id, kind)
+        ttl = self._ttl(kind)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is not None and entry[2] == version:
+            value, fetched_at, _ = entry
+            age = time.time() - fetched_at
+            if age < ttl:
+                if age >= ttl * CONF.clouds.catalog_refresh_ahead:
+                    self._refresh(key, loader, version)
+                return value
+            if age < ttl + CONF.clouds.catalog_stale_ttl:
+                self._refresh(key, loader, version)
+                return value
+
+        return self._load(key, loader, version)
+
+    def _load(self, key, loader, version):
+        with self._lock:
+            generation = self._generations.get(key, 0)
+
+        value = loader()
+
+        with self._lock:
+            # Don't store results that were loaded before an invalidation
+            if self._generations.get(key, 0) == generation:
+                self._entries[key] = (value, time.time(), version)
+        return value
+
+    def _refresh(self, key, loader, version):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._load(key, loader, version)
+            except Exception:
+                LOG.exception("Refreshing the {1} of cloud {0} "
+                              "failed".format(*key))
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        LOG.debug("Refreshing the {1} of cloud {0}".format(*key))
+        thread = threading.Thread(target=refresh)
+        thread.daemon = True
+        thread.start()
+
+    def invalidate(self, cloud_id, kind=None):
+        kinds = [kind] if kind else KINDS
+        with self._lock:
+            for kind in kinds:
+                key = (cloud_id, kind)
+                self._entries.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+
+CATALOG = CatalogCache()
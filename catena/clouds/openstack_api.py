@@ -14,17 +14,23 @@
 # limitations under the License.
 
 import base64
+import copy
+import time
 import uuid
 
 import openstack.connection
+from openstack import exceptions
 from oslo_config import cfg
 from oslo_log import log
 
+from catena.clouds.catalog import CATALOG
 from catena.common.utils import encrypt_private_rsakey
 
 LOG = log.getLogger(__name__)
 CONF = cfg.CONF
 
+IMAGE_POLL_INTERVAL = 10
+
 
 class OpenStack(object):
     @staticmethod
@@ -32,7 +38,10 @@ class OpenStack(object):
         return str(uuid.uuid4())
 
     def __init__(self, cloud):
-        self.cloud = cloud
+        # Clients are shared between threads (and sessions), so they only
+        # keep copies of the model's data
+        self.cloud_id = cloud.id
+        self.provider_config = copy.deepcopy(cloud.get_cloud_config())
         self.connection = openstack.connection.Connection(
             verify=False,
             **cloud.get_authentication())
@@ -47,6 +56,18 @@ class OpenStack(object):
 
         return result
 
+    def get_flavour_details(self):
+        """Returns the vCPUs and memory (in MB) of every flavour by name"""
+        LOG.debug("Getting node flavour details")
+
+        result = {}
+
+        for flavor in self.connection.compute.flavors():
+            result[flavor.name] = {'vcpus': flavor.vcpus,
+                                   'memory': flavor.ram}
+
+        return result
+
     def get_networks(self):
         LOG.debug("Getting networks")
 
@@ -83,9 +104,9 @@ class OpenStack(object):
         instance_light = self.connection.compute.find_server(instance_name)
         return self.connection.compute.get_server(instance_light)
 
-    def add_node(self, public_key, flavour_name, name, chain):
+    def create_server(self, public_key, flavour_name, name, chain):
         cloud_config = chain.get_cloud_config()
-        provider_config = self.cloud.get_cloud_config()
+        provider_config = self.provider_config
 
         LOG.debug("Creating server")
 
@@ -103,17 +124,51 @@ class OpenStack(object):
             user_data=base64.b64encode(provider_config['user_data'])
         )
 
-        server = self.connection.compute.wait_for_server(server)
+        CATALOG.invalidate(self.cloud_id, 'instances')
 
-        ip = server.addresses[cloud_config['network']][0]['addr']
+        return server.id
 
-        import time
-        time.sleep(120)
+    def wait_for_ip(self, chain, id):
+        cloud_config = chain.get_cloud_config()
+
+        server = self.connection.compute.get_server(id)
+        server = self.connection.compute.wait_for_server(server)
 
-        return (server.id, ip)
+        return server.addresses[cloud_config['network']][0]['addr']
 
     def delete_node(self, chain, id):
-        self.connection.compute.delete_server(id)
+        try:
+            server = self.connection.compute.get_server(id)
+        except exceptions.ResourceNotFound:
+            LOG.debug("Server {} is already deleted".format(id))
+            return
+
+        self.connection.compute.delete_server(server)
+        self.connection.compute.wait_for_delete(server)
+        CATALOG.invalidate(self.cloud_id, 'instances')
+
+    def create_image(self, chain, id, name):
+        """Snapshots a server and returns the provider config to boot it"""
+        server = self.connection.compute.get_server(id)
+        self.connection.compute.create_server_image(server, name)
+
+        deadline = time.time() + CONF.clouds.image_timeout
+        while True:
+            image = self.connection.compute.find_image(name)
+            if image is not None:
+                image = self.connection.compute.get_image(image)
+                if image.status == 'ACTIVE':
+                    break
+                if image.status in ('ERROR', 'DELETED'):
+                    raise Exception('Creating image {} failed: {}'.format(
+                        name, image.status))
+
+            if time.time() > deadline:
+                raise Exception('Timeout while creating image {}'.format(
+                    name))
+            time.sleep(IMAGE_POLL_INTERVAL)
+
+        return {'image_name': name}
 
     def initialize_cloud(self, chain):
         cloud_config = chain.get_cloud_config()
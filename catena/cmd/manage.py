@@ -15,24 +15,31 @@
 
 from __future__ import print_function
 
-import os
+import json
 import subprocess
 import sys
-import tempfile
+import time
 
 from oslo_config import cfg
 from oslo_db.sqlalchemy import enginefacade
 from oslo_log import log
 
 from catena.common import config
-from catena.common.utils import decrypt_private_rsakey
-from catena.common.utils import decrypt_rsakey
+from catena.common import ssh_utils
+from catena.common.utils import decrypt_key
 from catena.db.sqlalchemy import api as db_api
 from catena.db.sqlalchemy import models
+from catena.service import metrics
+from catena.service import rekey
+from catena.service import service
+from catena.service import snapshots
 
 CONF = cfg.CONF
 LOG = log.getLogger(__name__)
 
+# Seconds between two checks for chains that are due for a snapshot
+SNAPSHOT_CHECK_INTERVAL = 600
+
 
 def register_models():
     context = enginefacade.writer.get_engine()
@@ -53,7 +60,7 @@ def output_ssh_key():
     node = db_api.get_node(context, chain, CONF.sub.node_id)
     if node is None:
         return LOG.error('This node-id does not exist')
-    print(decrypt_rsakey(node.ssh_key))
+    print(decrypt_key(node.ssh_key))
 
 
 def open_ssh_connection():
@@ -67,25 +74,19 @@ def open_ssh_connection():
     if node is None:
         return LOG.error('This node-id does not exist')
 
-    home = os.path.expanduser("~/.ssh")
-
     jumpbox_ip = chain.get_cloud_config()['jumpbox_ip']
 
-    with tempfile.NamedTemporaryFile(
-            dir=home) as temp_node_ssh, tempfile.NamedTemporaryFile(
-        dir=home) as temp_jumpbox_ssh:
-        decrypt_private_rsakey(node.ssh_key, temp_node_ssh)
-        decrypt_private_rsakey(
-            chain.get_cloud_config()['jumpbox_key'],
-            temp_jumpbox_ssh
-        )
+    with ssh_utils.private_key_files(
+            node.ssh_key,
+            chain.get_cloud_config()['jumpbox_key']) as key_files:
+        node_key_file, jumpbox_key_file = key_files
 
         args = [
             '/bin/bash', '-c',
             'ssh -i {} -o ProxyCommand="ssh -q -i {} -W %h:%p ubuntu@{}" -o '
             'StrictHostKeyChecking=no ubuntu@{}'.format(
-                temp_node_ssh.name,
-                temp_jumpbox_ssh.name,
+                node_key_file,
+                jumpbox_key_file,
                 jumpbox_ip,
                 node.ip)
         ]
@@ -94,6 +95,62 @@ def open_ssh_connection():
         process.wait()
 
 
+def run_warm_pool():
+    while True:
+        try:
+            service.refill_warm_pools()
+        except Exception:
+            LOG.exception('Could not refill the warm pools')
+
+        if CONF.sub.once:
+            return
+        time.sleep(CONF.warm_pool.interval)
+
+
+def build_image():
+    image_config = service.build_image(CONF.sub.chain_id, CONF.sub.flavour,
+                                       CONF.sub.name)
+    print(image_config)
+
+
+def run_snapshots():
+    if CONF.sub.chain_id:
+        return snapshots.create_snapshot(CONF.sub.chain_id)
+
+    while True:
+        try:
+            snapshots.create_due_snapshots()
+        except Exception:
+            LOG.exception('Could not create the snapshots')
+
+        if CONF.sub.once:
+            return
+        time.sleep(min(CONF.snapshots.interval, SNAPSHOT_CHECK_INTERVAL))
+
+
+def run_metrics():
+    while True:
+        try:
+            metrics.collect()
+        except Exception:
+            LOG.exception('Could not collect the node metrics')
+
+        if CONF.sub.once:
+            return
+        time.sleep(CONF.metrics.interval)
+
+
+def run_benchmark():
+    result = service.run_benchmark(CONF.sub.chain_id, CONF.sub.rate,
+                                   CONF.sub.duration)
+    print(json.dumps(result, indent=2, sort_keys=True))
+
+
+def run_rekey():
+    count = rekey.rekey(CONF.sub.batch_size, CONF.sub.workers)
+    print('Re-encrypted {} keys'.format(count))
+
+
 def register_sub_opts(subparser):
     parser = subparser.add_parser('db_sync')
     parser.set_defaults(action_fn=register_models)
@@ -115,6 +172,55 @@ def register_sub_opts(subparser):
     parser.set_defaults(action_fn=open_ssh_connection)
     parser.set_defaults(action='ssh')
 
+    parser = subparser.add_parser('warm_pool')
+    parser.add_argument('--once', action='store_true',
+                        help='Refill the pools once instead of periodically')
+    parser.set_defaults(action_fn=run_warm_pool)
+    parser.set_defaults(action='warm_pool')
+
+    parser = subparser.add_parser('build_image')
+    parser.add_argument('chain_id',
+                        help='Chain whose cloud, network and jumpbox are '
+                             'used for the builder VM')
+    parser.add_argument('flavour')
+    parser.add_argument('--name', help='Name of the image')
+    parser.set_defaults(action_fn=build_image)
+    parser.set_defaults(action='build_image')
+
+    parser = subparser.add_parser('snapshot')
+    parser.add_argument('--chain-id', dest='chain_id',
+                        help='Snapshot this chain now instead of all chains '
+                             'whose latest snapshot is too old')
+    parser.add_argument('--once', action='store_true',
+                        help='Create the due snapshots once instead of '
+                             'periodically')
+    parser.set_defaults(action_fn=run_snapshots)
+    parser.set_defaults(action='snapshot')
+
+    parser = subparser.add_parser('metrics')
+    parser.add_argument('--once', action='store_true',
+                        help='Poll the nodes once instead of periodically')
+    parser.set_defaults(action_fn=run_metrics)
+    parser.set_defaults(action='metrics')
+
+    parser = subparser.add_parser('benchmark')
+    parser.add_argument('chain_id')
+    parser.add_argument('--rate', type=float,
+                        help='Transactions per second to send')
+    parser.add_argument('--duration', type=int,
+                        help='Seconds to send transactions for')
+    parser.set_defaults(action_fn=run_benchmark)
+    parser.set_defaults(action='benchmark')
+
+    parser = subparser.add_parser('rekey')
+    parser.add_argument('--batch-size', dest='batch_size', type=int,
+                        default=100,
+                        help='Rows re-encrypted and committed at a time')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Processes re-encrypting the keys')
+    parser.set_defaults(action_fn=run_rekey)
+    parser.set_defaults(action='rekey')
+
 
 SUB_OPTS = [
     cfg.SubCommandOpt(
@@ -135,5 +241,8 @@ def main():
             return CONF.sub.action_fn()
         if CONF.sub.action.startswith('ssh'):
             return CONF.sub.action_fn()
+        if CONF.sub.action in ('warm_pool', 'build_image', 'snapshot',
+                               'benchmark', 'metrics', 'rekey'):
+            return CONF.sub.action_fn()
     except Exception as e:
         sys.exit("ERROR: {0}".format(e))
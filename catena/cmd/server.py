@@ -16,31 +16,91 @@
 import sys
 from wsgiref import simple_server
 
+from gunicorn.app import base as gunicorn_base
 from oslo_config import cfg
 from oslo_log import log
 
 from catena.api import app
 from catena.common import config
+from catena.common import keypool
+from catena.service import jobs
 
 CONF = cfg.CONF
 LOG = log.getLogger(__name__)
 
 
+class CatenaApplication(gunicorn_base.BaseApplication):
+    """Serves the catena API with a pre-forking gunicorn server.
+
+    Every worker process runs a pool of request threads (gthread worker),
+    which also gives us HTTP/1.1 keep-alive. Sending SIGHUP to the master
+    process gracefully replaces the workers.
+    """
+
+    def __init__(self, ip, port):
+        self.bind = '{}:{}'.format(ip, port)
+        super(CatenaApplication, self).__init__()
+
+    def load_config(self):
+        settings = {
+            'bind': self.bind,
+            'workers': CONF.get('workers'),
+            'threads': CONF.get('threads'),
+            'worker_class': 'gthread',
+            'keepalive': CONF.get('keepalive'),
+            'backlog': CONF.get('backlog'),
+            'graceful_timeout': CONF.get('graceful_timeout'),
+            'proc_name': 'catena-api',
+            'post_worker_init': _post_worker_init,
+            'worker_exit': _worker_exit,
+        }
+        for key, value in settings.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return app.configure_application()
+
+
+def _post_worker_init(worker):
+    keypool.start()
+    jobs.resume()
+
+
+def _worker_exit(server, worker):
+    # Running jobs delay the exit up to graceful_timeout
+    jobs.shutdown()
+
+
+def _serve_simple(ip, port):
+    application = app.configure_application()
+    keypool.start()
+    jobs.resume()
+    httpd = simple_server.make_server(ip, port, application)
+    httpd.serve_forever()
+
+
+def _serve_gunicorn(ip, port):
+    CatenaApplication(ip, port).run()
+
+
+SERVERS = {'simple': _serve_simple, 'gunicorn': _serve_gunicorn}
+
+
 def main():
     config.parse_args(args=sys.argv[1:])
     config.setup_logging()
     ip = CONF.get('host', '0.0.0.0')
     port = CONF.get('port', 1999)
-    application = app.configure_application()
+    server_mode = CONF.get('server_mode', 'gunicorn')
     try:
-        httpd = simple_server.make_server(ip, int(port), application)
-        message = ('Server listening on %(ip)s:%(port)s' % {
+        message = ('Server listening on %(ip)s:%(port)s (%(mode)s)' % {
             'ip': ip,
-            'port': port
+            'port': port,
+            'mode': server_mode
         })
         LOG.info(message)
         print(message)
-        httpd.serve_forever()
+        SERVERS[server_mode](ip, int(port))
     except KeyboardInterrupt:
         print("Thank You ! \nBye.")
         sys.exit(0)
@@ -0,0 +1,87 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Ansible stdout callback writing one JSON event per line
+
+This plugin is loaded by ansible-playbook (see
+catena.common.ansible_utils.launch_playbook), not by catena itself. Tasks
+report values back to catena by setting the catena_result fact.
+"""
+
+import json
+import sys
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'stdout'
+    CALLBACK_NAME = 'catena_json'
+
+    def __init__(self):
+        super(CallbackModule, self).__init__()
+        self._task_started = {}
+
+    def _emit(self, event):
+        sys.stdout.write(json.dumps(event) + '\n')
+        sys.stdout.flush()
+
+    def _result_event(self, event, result):
+        task = result._task
+        started = self._task_started.get(task._uuid, time.time())
+        return {
+            'event': event,
+            'host': result._host.get_name(),
+            'task': task.get_name(),
+            'duration': time.time() - started,
+        }
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self._task_started[task._uuid] = time.time()
+
+    def v2_playbook_on_handler_task_start(self, task):
+        self._task_started[task._uuid] = time.time()
+
+    def v2_runner_on_ok(self, result):
+        event = self._result_event('ok', result)
+        facts = result._result.get('ansible_facts', {})
+        if 'catena_result' in facts:
+            event['result'] = facts['catena_result']
+        self._emit(event)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        event = self._result_event('failed', result)
+        event['ignore_errors'] = ignore_errors
+        event['msg'] = result._result.get('msg') or result._result.get(
+            'stderr', '')
+        self._emit(event)
+
+    def v2_runner_on_unreachable(self, result):
+        event = self._result_event('unreachable', result)
+        event['msg'] = result._result.get('msg', '')
+        self._emit(event)
+
+    def v2_runner_on_skipped(self, result):
+        self._emit(self._result_event('skipped', result))
+
+    def v2_playbook_on_stats(self, stats):
+        self._emit({
+            'event': 'stats',
+            'hosts': dict((host, stats.summarize(host))
+                          for host in sorted(stats.processed.keys()))
+        })
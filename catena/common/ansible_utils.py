@@ -16,37 +16,137 @@
 import json
 import os
 import subprocess
+import tempfile
+import time
 
+from oslo_config import cfg
 from oslo_log import log
 
+from catena.common import ssh_utils
+
+CONF = cfg.CONF
 LOG = log.getLogger(__name__)
 
+# Directory of the catena_json stdout callback, see
+# catena.common.ansible_callbacks.catena_json
+CALLBACK_PLUGINS = os.path.join(os.path.dirname(__file__),
+                                'ansible_callbacks')
 
-def execute(cmd):
-    popen = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True,
-                             universal_newlines=True)
-    for stdout_line in iter(popen.stdout.readline, ""):
-        yield stdout_line
-    popen.stdout.close()
-    return_code = popen.wait()
-    if return_code:
-        raise subprocess.CalledProcessError(return_code, cmd)
+
+class PlaybookRun(object):
+    """Collects the events of an ansible-playbook run
+
+    results maps every host to the catena_result it reported, timings is a
+    list of (host, task, seconds) and failures a list of (host, task,
+    message).
+    """
+
+    def __init__(self, playbook):
+        self.playbook = playbook
+        self.results = {}
+        self.timings = []
+        self.failures = []
+        self.duration = None
+
+    def handle(self, event):
+        if event['event'] == 'stats':
+            return
+
+        self.timings.append((event['host'], event['task'],
+                             event['duration']))
+
+        if event['event'] == 'ok' and 'result' in event:
+            self.results.setdefault(event['host'], {}).update(
+                event['result'])
+        elif event['event'] == 'unreachable' or (
+                event['event'] == 'failed' and not event['ignore_errors']):
+            self.failures.append((event['host'], event['task'],
+                                  event['msg']))
+
+    def task_durations(self):
+        """Returns the slowest host's duration of every task in run order"""
+        durations = []
+        index = {}
+        for host, task, seconds in self.timings:
+            if task not in index:
+                index[task] = len(durations)
+                durations.append([task, seconds])
+            else:
+                durations[index[task]][1] = max(durations[index[task]][1],
+                                                seconds)
+        return [tuple(duration) for duration in durations]
 
 
-def launch_playbook(playbook, private_key_file, hosts, ansible_vars,
-                    jumpbox_ip, jumpbox_key):
-    host_list = ",".join(hosts) + ","  # Needs a trailing comma
+def launch_playbook(playbook, host_keys, ansible_vars, jumpbox_ip,
+                    jumpbox_key, host_vars=None):
+    """Runs a playbook against one or more hosts in a single run
+
+    host_keys maps every host to the private key file used to log into it,
+    host_vars optionally maps hosts to variables only set for them.
+    Returns the PlaybookRun, raises an exception if the run failed.
+    """
     extra_vars = json.dumps(ansible_vars, ensure_ascii=False)
-    ssh_args = '-o ProxyCommand="ssh -q -i \\"{}\\" -W %h:%p ubuntu@{}" -o ' \
-               'StrictHostKeyChecking=no'.format(jumpbox_key, jumpbox_ip)
+    proxy_command = ssh_utils.proxy_command(jumpbox_ip, jumpbox_key)
+    ssh_args = '-o ProxyCommand="{}" -o StrictHostKeyChecking=no'.format(
+        proxy_command.replace('"', '\\"'))
     playbook_path = os.path.join(os.path.dirname(__file__), playbook)
+    forks = min(len(host_keys), CONF.ansible.forks)
+
+    # Ansible multiplexes the connections to the nodes in the same
+    # directory as the jumpbox connections, so concurrent runs share them
+    env = dict(os.environ,
+               ANSIBLE_PIPELINING=str(CONF.ansible.pipelining),
+               ANSIBLE_SSH_CONTROL_PATH_DIR=os.path.join(
+                   ssh_utils.control_path_dir(), 'ansible'),
+               ANSIBLE_STDOUT_CALLBACK='catena_json',
+               ANSIBLE_CALLBACK_PLUGINS=CALLBACK_PLUGINS,
+               ANSIBLE_RETRY_FILES_ENABLED='False')
+
+    run = PlaybookRun(playbook)
+
+    with tempfile.NamedTemporaryFile(mode='w') as inventory:
+        for host, private_key_file in host_keys.items():
+            variables = dict((host_vars or {}).get(host, {}),
+                             ansible_ssh_private_key_file=private_key_file)
+            inventory.write('{} {}\n'.format(host, ' '.join(
+                '{}="{}"'.format(key, value)
+                for key, value in sorted(variables.items()))))
+        inventory.flush()
 
-    command = ["ansible-playbook", playbook_path, "-i", host_list,
-               "--user=ubuntu", "--private-key={}".format(private_key_file),
-               "--ssh-common-args='{}'".format(ssh_args),
-               "--extra-vars='{}'".format(extra_vars)]
+        command = ["ansible-playbook", playbook_path, "-i", inventory.name,
+                   "--user={}".format(ssh_utils.SSH_USER),
+                   "--forks={}".format(forks),
+                   "--ssh-common-args={}".format(ssh_args),
+                   "--extra-vars={}".format(extra_vars)]
 
-    LOG.debug("Running: {}".format(" ".join(command)))
+        LOG.debug("Running playbook {} against {}".format(
+            playbook, ", ".join(host_keys)))
+        start = time.time()
+
+        process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, env=env,
+                                   universal_newlines=True)
+        for line in iter(process.stdout.readline, ""):
+            try:
+                event = json.loads(line)
+            except ValueError:
+                # Warnings and errors of ansible itself
+                LOG.debug(line.rstrip())
+                continue
+            run.handle(event)
+        process.stdout.close()
+        return_code = process.wait()
+
+    run.duration = time.time() - start
+    LOG.debug("Playbook {} finished in {:.1f}s: {}".format(
+        playbook, run.duration, ", ".join(
+            "{} {:.1f}s".format(task, seconds)
+            for task, seconds in run.task_durations())))
+
+    if return_code:
+        raise Exception("Playbook {} failed ({}): {}".format(
+            playbook, return_code, "; ".join(
+                "{}: {}: {}".format(host, task, message)
+                for host, task, message in run.failures)))
 
-    for stdout_line in execute(" ".join(command)):
-        LOG.debug(stdout_line.strip())
+    return run
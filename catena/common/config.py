@@ -26,13 +26,231 @@ _OPTS = [cfg.IPOpt('host', default="0.0.0.0",
                    help="The IP address to be used to bind the web server"),
          cfg.PortOpt('port', default=1989,
                      help="Port to access the webservice"),
+         cfg.StrOpt('server_mode', default='gunicorn',
+                    choices=['gunicorn', 'simple'],
+                    help="The web server used to serve the API. 'gunicorn' "
+                         "runs a pre-forking multi-worker server, 'simple' "
+                         "runs the single-threaded wsgiref server (only "
+                         "useful for development)."),
+         cfg.IntOpt('workers', default=4, min=1,
+                    help="Number of pre-forked worker processes serving the "
+                         "API (gunicorn server mode only)"),
+         cfg.IntOpt('threads', default=8, min=1,
+                    help="Number of request threads per worker process "
+                         "(gunicorn server mode only)"),
+         cfg.IntOpt('keepalive', default=5, min=0,
+                    help="Seconds to keep an idle HTTP/1.1 connection open "
+                         "(gunicorn server mode only)"),
+         cfg.IntOpt('backlog', default=2048, min=1,
+                    help="Maximum number of pending connections queued by "
+                         "the listening socket (gunicorn server mode only)"),
+         cfg.IntOpt('graceful_timeout', default=600, min=0,
+                    help="Seconds workers are given to finish in-flight "
+                         "requests and the provisioning jobs they run on "
+                         "reload (SIGHUP) or shutdown (gunicorn server mode "
+                         "only). Jobs still running afterwards are taken "
+                         "over by another worker once their lease "
+                         "([jobs] lease) expired."),
+         cfg.IntOpt('max_limit', default=1000, min=1,
+                    help="Maximum number of items returned by a single list "
+                         "request. Also used when no limit is requested."),
          cfg.StrOpt('encryption_key', required=True,
                     help="The encryption key for the ssh key files"),
+         cfg.ListOpt('previous_encryption_keys', default=[], secret=True,
+                     help="Keys that were used as encryption_key before. "
+                          "Keys encrypted with them can still be decrypted "
+                          "until 'catena-manage rekey' re-encrypted them."),
          cfg.StrOpt('base_image', default="Catena",
                     help="The image used when provisioning new nodes. "
                          "Currently only "
                          "Ubuntu 16.04 is supported.")]
 
+_JOBS_OPTS = [cfg.IntOpt('workers', default=4, min=1,
+                         help="Number of threads per API process running "
+                              "asynchronous provisioning jobs"),
+              cfg.BoolOpt('resume', default=True,
+                          help="Take over the pending jobs and the jobs "
+                               "whose lease expired, e.g. because their API "
+                               "process crashed or was replaced on reload. "
+                               "Safe with several API hosts."),
+              cfg.IntOpt('lease', default=120, min=10,
+                         help="Seconds after which a running job whose "
+                              "process stopped renewing it is taken over. "
+                              "The lease is renewed every quarter of it."),
+              cfg.IntOpt('boot_workers', default=10, min=1,
+                         help="Maximum number of nodes a job creates and "
+                              "boots concurrently"),
+              cfg.IntOpt('teardown_workers', default=10, min=1,
+                         help="Maximum number of nodes deleted concurrently "
+                              "when a chain is deleted")]
+
+_CLOUDS_OPTS = [cfg.IntOpt('client_cache_size', default=32, min=1,
+                           help="Maximum number of cloud API clients (and "
+                                "their tokens and connection pools) kept "
+                                "per process"),
+                cfg.IntOpt('client_cache_ttl', default=1800, min=1,
+                           help="Seconds after which a cached cloud API "
+                                "client is re-created"),
+                cfg.IntOpt('flavours_ttl', default=3600, min=0,
+                           help="Seconds the node flavours of a cloud are "
+                                "cached"),
+                cfg.IntOpt('networks_ttl', default=600, min=0,
+                           help="Seconds the networks of a cloud are cached"),
+                cfg.IntOpt('instances_ttl', default=60, min=0,
+                           help="Seconds the instances of a cloud are "
+                                "cached. Creating or deleting a VM only "
+                                "invalidates the listing of the API process "
+                                "doing it, the other processes serve theirs "
+                                "for up to instances_ttl + "
+                                "catalog_stale_ttl."),
+                cfg.FloatOpt('catalog_refresh_ahead', default=0.8, min=0,
+                             max=1,
+                             help="Fraction of the TTL after which a cached "
+                                  "catalog listing is refreshed in the "
+                                  "background"),
+                cfg.IntOpt('catalog_stale_ttl', default=300, min=0,
+                           help="Seconds an expired catalog listing is still "
+                                "served while it is refreshed in the "
+                                "background"),
+                cfg.IntOpt('image_timeout', default=3600, min=1,
+                           help="Seconds to wait for a snapshot of a builder "
+                                "VM (catena-manage build_image)")]
+
+_ANSIBLE_OPTS = [cfg.IntOpt('forks', default=20, min=1,
+                            help="Maximum number of nodes a single ansible "
+                                 "run provisions in parallel"),
+                 cfg.BoolOpt('pipelining', default=True,
+                             help="Run ansible modules over the open ssh "
+                                  "connection instead of copying them to "
+                                  "the node first")]
+
+_ETHEREUM_OPTS = [cfg.IntOpt('max_bootnodes', default=8, min=1,
+                             help="Maximum number of the chain's nodes a "
+                                  "new node is given as bootnodes. They are "
+                                  "picked randomly to spread the load."),
+                  cfg.IntOpt('block_period', default=5, min=0,
+                             help="Default seconds between two blocks of "
+                                  "proof-of-authority chains, chains can "
+                                  "override it with block_period"),
+                  cfg.IntOpt('gas_limit', default=5000000, min=5000,
+                             help="Default gas limit of the genesis block of "
+                                  "proof-of-authority chains, chains can "
+                                  "override it with gas_limit"),
+                  cfg.IntOpt('signer_vote_timeout', default=300, min=1,
+                             help="Seconds to wait for the votes removing a "
+                                  "signer to take effect before its node is "
+                                  "deleted")]
+
+_BENCHMARK_OPTS = [cfg.IntOpt('accounts', default=16, min=0,
+                              help="Number of accounts funded in the genesis "
+                                   "of new chains to send benchmark "
+                                   "transactions from. 0 disables "
+                                   "benchmarks of new chains."),
+                   cfg.IntOpt('senders', default=8, min=1,
+                              help="Maximum number of transactions sent "
+                                   "concurrently"),
+                   cfg.FloatOpt('rate', default=20.0, min=0.1,
+                                help="Default transactions per second a "
+                                     "benchmark sends"),
+                   cfg.IntOpt('duration', default=60, min=1,
+                              help="Default seconds a benchmark sends "
+                                   "transactions"),
+                   cfg.IntOpt('timeout', default=120, min=0,
+                              help="Seconds to wait for the transactions to "
+                                   "be included after sending them")]
+
+_METRICS_OPTS = [cfg.IntOpt('interval', default=60, min=1,
+                            help="Seconds between two polls of the nodes' "
+                                 "status by 'catena-manage metrics'"),
+                 cfg.IntOpt('workers', default=32, min=1,
+                            help="Maximum number of nodes polled "
+                                 "concurrently"),
+                 cfg.IntOpt('jumpbox_concurrency', default=8, min=1,
+                            help="Maximum number of nodes polled "
+                                 "concurrently through the same jumpbox")]
+
+_SNAPSHOTS_OPTS = [cfg.BoolOpt('enabled', default=False,
+                               help="Seed new nodes with the latest "
+                                    "chaindata snapshot of their chain. "
+                                    "Snapshots are created by 'catena-manage "
+                                    "snapshot'."),
+                   cfg.IntOpt('interval', default=86400, min=1,
+                              help="Seconds between two snapshots of a "
+                                   "chain"),
+                   cfg.IntOpt('keep', default=2, min=1,
+                              help="Number of snapshots kept per chain"),
+                   cfg.StrOpt('jumpbox_dir', default='catena-snapshots',
+                              help="Directory on the jumpbox the snapshots "
+                                   "are stored in, relative to the home "
+                                   "directory"),
+                   cfg.IntOpt('workers', default=4, min=1,
+                              help="Maximum number of snapshots created or "
+                                   "nodes seeded concurrently"),
+                   cfg.IntOpt('timeout', default=3600, min=1,
+                              help="Seconds after which a snapshot that is "
+                                   "still being created, e.g. because "
+                                   "catena-manage crashed, is removed")]
+
+_SSH_OPTS = [cfg.StrOpt('control_path_dir', default='~/.ssh/catena',
+                        help="Directory of the sockets of the shared ssh "
+                             "connections to the jumpboxes and nodes"),
+             cfg.IntOpt('control_persist', default=600, min=0,
+                        help="Seconds a shared ssh connection to a jumpbox "
+                             "is kept open while unused. 0 disables shared "
+                             "connections."),
+             cfg.StrOpt('key_algorithm', default='rsa',
+                        choices=('rsa', 'ed25519'),
+                        help="Algorithm of the ssh keys generated for new "
+                             "nodes. Not every cloud accepts ed25519 keys."),
+             cfg.IntOpt('key_bits', default=2048, min=2048,
+                        help="Size of generated RSA keys"),
+             cfg.IntOpt('key_pool_size', default=8, min=0,
+                        help="Number of keypairs a separate process keeps "
+                             "generated ahead of time in every API worker. "
+                             "0 generates them on demand."),
+             cfg.StrOpt('key_dir', default='',
+                        help="Directory the decrypted keys are written to "
+                             "while ssh and ansible use them. Defaults to "
+                             "/dev/shm (a tmpfs) if it exists, ~/.ssh "
+                             "otherwise."),
+             cfg.IntOpt('key_cache_size', default=256, min=0,
+                        help="Maximum number of decrypted keys kept in "
+                             "memory. 0 decrypts the keys on every use."),
+             cfg.IntOpt('key_cache_ttl', default=600, min=1,
+                        help="Seconds a decrypted key is kept in memory")]
+
+_READINESS_OPTS = [cfg.IntOpt('timeout', default=600, min=1,
+                              help="Seconds to wait for a new node to accept "
+                                   "ssh connections before giving up"),
+                   cfg.IntOpt('initial_interval', default=2, min=1,
+                              help="Seconds between the first readiness "
+                                   "probes, doubled after every failed probe"),
+                   cfg.IntOpt('max_interval', default=30, min=1,
+                              help="Maximum number of seconds between two "
+                                   "readiness probes"),
+                   cfg.IntOpt('connect_timeout', default=10, min=1,
+                              help="Timeout in seconds of a single readiness "
+                                   "probe connection"),
+                   cfg.BoolOpt('check_cloud_init', default=True,
+                               help="Only consider a node ready once "
+                                    "cloud-init has finished")]
+
+_WARM_POOL_OPTS = [cfg.BoolOpt('enabled', default=False,
+                               help="Create nodes from pools of pre-booted "
+                                    "VMs. The pools are refilled by "
+                                    "'catena-manage warm_pool'."),
+                   cfg.IntOpt('size', default=2, min=0,
+                              help="Number of VMs kept per cloud, flavour "
+                                   "and network"),
+                   cfg.ListOpt('flavours', default=[],
+                               help="Flavours for which VMs are kept"),
+                   cfg.IntOpt('max_age', default=86400, min=1,
+                              help="Seconds after which an unclaimed VM is "
+                                   "deleted"),
+                   cfg.IntOpt('interval', default=60, min=1,
+                              help="Seconds between two runs of the "
+                                   "refiller")]
+
 
 def parse_args(args=[]):
     CONF.register_opts(_OPTS)
@@ -40,6 +258,36 @@ def parse_args(args=[]):
     #    grp = cfg.OptGroup('jenkins', 'Jenkins configuration')
     #    CONF.register_group(grp)
     #    CONF.register_opts(_JENKINS, 'jenkins')
+    grp = cfg.OptGroup('jobs', 'Asynchronous job configuration')
+    CONF.register_group(grp)
+    CONF.register_opts(_JOBS_OPTS, 'jobs')
+    grp = cfg.OptGroup('clouds', 'Cloud API configuration')
+    CONF.register_group(grp)
+    CONF.register_opts(_CLOUDS_OPTS, 'clouds')
+    grp = cfg.OptGroup('ansible', 'Ansible configuration')
+    CONF.register_group(grp)
+    CONF.register_opts(_ANSIBLE_OPTS, 'ansible')
+    grp = cfg.OptGroup('benchmark', 'Benchmark configuration')
+    CONF.register_group(grp)
+    CONF.register_opts(_BENCHMARK_OPTS, 'benchmark')
+    grp = cfg.OptGroup('metrics', 'Node metrics configuration')
+    CONF.register_group(grp)
+    CONF.register_opts(_METRICS_OPTS, 'metrics')
+    grp = cfg.OptGroup('readiness', 'Node readiness probe configuration')
+    CONF.register_group(grp)
+    CONF.register_opts(_READINESS_OPTS, 'readiness')
+    grp = cfg.OptGroup('ethereum', 'Ethereum chain backend configuration')
+    CONF.register_group(grp)
+    CONF.register_opts(_ETHEREUM_OPTS, 'ethereum')
+    grp = cfg.OptGroup('snapshots', 'Chaindata snapshot configuration')
+    CONF.register_group(grp)
+    CONF.register_opts(_SNAPSHOTS_OPTS, 'snapshots')
+    grp = cfg.OptGroup('ssh', 'SSH connection configuration')
+    CONF.register_group(grp)
+    CONF.register_opts(_SSH_OPTS, 'ssh')
+    grp = cfg.OptGroup('warm_pool', 'Warm pool configuration')
+    CONF.register_group(grp)
+    CONF.register_opts(_WARM_POOL_OPTS, 'warm_pool')
     log.register_options(CONF)
     default_config_files = cfg.find_config_files('catena', 'api')
 
@@ -65,4 +313,16 @@ def setup_logging():
 
 
 def list_opts():
-    return {None: _OPTS}.items()
+    return {
+        None: _OPTS,
+        'ansible': _ANSIBLE_OPTS,
+        'benchmark': _BENCHMARK_OPTS,
+        'jobs': _JOBS_OPTS,
+        'clouds': _CLOUDS_OPTS,
+        'ethereum': _ETHEREUM_OPTS,
+        'metrics': _METRICS_OPTS,
+        'readiness': _READINESS_OPTS,
+        'snapshots': _SNAPSHOTS_OPTS,
+        'ssh': _SSH_OPTS,
+        'warm_pool': _WARM_POOL_OPTS,
+    }.items()
@@ -0,0 +1,134 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Pool of pre-generated ssh keypairs
+
+Generating an RSA key takes hundreds of milliseconds of CPU, which would
+hold the GIL of the API workers and serialize adding many nodes at once. A
+separate process keeps CONF.ssh.key_pool_size encrypted keypairs ready and
+refills the pool whenever a keypair is taken. If that process dies, e.g.
+killed by the OOM killer, it is replaced on the next refill.
+"""
+
+import collections
+import threading
+
+import futurist
+from oslo_config import cfg
+from oslo_log import log
+
+from catena.common import utils
+
+CONF = cfg.CONF
+LOG = log.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _generate(algorithm, bits, encryption_key):
+    # Runs in the worker process, which gets the settings passed explicitly
+    return utils.create_and_encrypt_sshkey(algorithm, bits, encryption_key)
+
+
+class KeyPool(object):
+    def __init__(self, size):
+        self.size = size
+        self._keypairs = collections.deque()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = futurist.ProcessPoolExecutor(max_workers=1)
+
+    def get(self):
+        """Returns a public key and encrypted private key
+
+        The keypair is generated in the calling thread if the pool is empty.
+        """
+        with self._lock:
+            keypair = self._keypairs.popleft() if self._keypairs else None
+        try:
+            self.refill()
+        except Exception as e:
+            LOG.warning("Could not refill the key pool: {}".format(e))
+
+        if keypair is None:
+            LOG.debug("Key pool is empty, generating a keypair")
+            keypair = utils.create_and_encrypt_sshkey()
+        return keypair
+
+    def refill(self, restart=True):
+        with self._lock:
+            missing = self.size - len(self._keypairs) - self._pending
+            if missing <= 0:
+                return
+            self._pending += missing
+            executor = self._executor
+
+        for submitted in range(missing):
+            try:
+                future = executor.submit(
+                    _generate, CONF.ssh.key_algorithm, CONF.ssh.key_bits,
+                    CONF.get('encryption_key'))
+            except RuntimeError as e:
+                # BrokenProcessPool (a RuntimeError) once the process died
+                LOG.warning("Key generation process failed, restarting it: "
+                            "{}".format(e))
+                self._replace(executor, missing - submitted)
+                if restart:
+                    self.refill(restart=False)
+                return
+            future.add_done_callback(self._add)
+
+    def _replace(self, executor, unsubmitted):
+        with self._lock:
+            self._pending -= unsubmitted
+            # Another thread may have replaced the broken executor already
+            if self._executor is executor:
+                self._executor = futurist.ProcessPoolExecutor(max_workers=1)
+        executor.shutdown(wait=False)
+
+    def _add(self, future):
+        with self._lock:
+            self._pending -= 1
+            if future.exception() is None:
+                self._keypairs.append(future.result())
+
+        if future.exception() is not None:
+            LOG.warning("Could not generate a keypair: {}".format(
+                future.exception()))
+
+
+def _get_pool():
+    # The pool is created lazily so that every (forked) API worker gets its
+    # own worker process
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = KeyPool(CONF.ssh.key_pool_size)
+    return _pool
+
+
+def start():
+    """Starts filling the pool, so the first requests find keypairs"""
+    if CONF.ssh.key_pool_size > 0:
+        _get_pool().refill()
+
+
+def get_keypair():
+    """Returns a public key and encrypted private key for a new VM"""
+    if CONF.ssh.key_pool_size <= 0:
+        return utils.create_and_encrypt_sshkey()
+    return _get_pool().get()
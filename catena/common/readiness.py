@@ -0,0 +1,70 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import subprocess
+import time
+
+from oslo_config import cfg
+from oslo_log import log
+
+from catena.common import ssh_utils
+
+CONF = cfg.CONF
+LOG = log.getLogger(__name__)
+
+# Written by cloud-init once all boot stages (including user data) finished
+CLOUD_INIT_MARKER = '/var/lib/cloud/instance/boot-finished'
+
+
+def wait_for_ssh(ip, private_key_file, jumpbox_ip, jumpbox_key_file):
+    """Waits until a node accepts ssh connections through the jumpbox
+
+    The node is polled with exponential backoff until readiness.timeout is
+    reached. With readiness.check_cloud_init the node is only ready once
+    cloud-init has finished as well.
+    """
+    remote_command = 'true'
+    if CONF.readiness.check_cloud_init:
+        remote_command = 'test -f {}'.format(CLOUD_INIT_MARKER)
+
+    command = ssh_utils.ssh_command(
+        ip, private_key_file, jumpbox_ip, jumpbox_key_file, [
+            'BatchMode=yes',
+            'UserKnownHostsFile=/dev/null',
+            'ConnectTimeout={}'.format(CONF.readiness.connect_timeout)
+        ]) + [remote_command]
+
+    start = time.time()
+    deadline = start + CONF.readiness.timeout
+    interval = CONF.readiness.initial_interval
+
+    while True:
+        with open(os.devnull, 'w') as devnull:
+            return_code = subprocess.call(command, stdout=devnull,
+                                          stderr=devnull)
+        if return_code == 0:
+            LOG.debug("Node {} is ready after {:.0f}s".format(
+                ip, time.time() - start))
+            return
+
+        if time.time() + interval > deadline:
+            raise Exception('Node {} did not become ready within {} '
+                            'seconds'.format(ip, CONF.readiness.timeout))
+
+        LOG.debug("Node {} is not ready yet, retrying in {}s".format(
+            ip, interval))
+        time.sleep(interval)
+        interval = min(interval * 2, CONF.readiness.max_interval)
@@ -0,0 +1,278 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextlib
+import errno
+import os
+import socket
+import subprocess
+import tempfile
+import time
+
+from oslo_concurrency import lockutils
+from oslo_config import cfg
+from oslo_log import log
+
+from catena.common.utils import decrypt_private_key
+
+CONF = cfg.CONF
+LOG = log.getLogger(__name__)
+
+SSH_USER = 'ubuntu'
+
+# Seconds to wait for a port forwarding to be established
+TUNNEL_TIMEOUT = 30
+
+
+def control_path_dir():
+    path = os.path.expanduser(CONF.ssh.control_path_dir)
+    try:
+        os.makedirs(path, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    return path
+
+
+def _master_running(control_path, target):
+    with open(os.devnull, 'w') as devnull:
+        return subprocess.call(['ssh', '-o',
+                                'ControlPath={}'.format(control_path),
+                                '-O', 'check', target],
+                               stdout=devnull, stderr=devnull) == 0
+
+
+def jumpbox_master(jumpbox_ip, jumpbox_key_file):
+    """Starts the shared connection to a jumpbox unless it is running
+
+    All connections through the jumpbox (of all processes) are multiplexed
+    over this connection. It is closed after ssh.control_persist idle
+    seconds. Returns the control path of the connection, or None if
+    multiplexing is disabled or the connection could not be started.
+    """
+    if not CONF.ssh.control_persist:
+        return None
+
+    target = '{}@{}'.format(SSH_USER, jumpbox_ip)
+    socket_dir = control_path_dir()
+    control_path = os.path.join(socket_dir, target)
+
+    with lockutils.lock(target, lock_file_prefix='catena-ssh-',
+                        external=True, lock_path=socket_dir):
+        if _master_running(control_path, target):
+            return control_path
+
+        # A socket left behind by a killed master would disable multiplexing
+        if os.path.exists(control_path):
+            os.unlink(control_path)
+
+        LOG.debug("Starting shared connection to jumpbox {}".format(
+            jumpbox_ip))
+        command = ['ssh', '-q', '-i', jumpbox_key_file,
+                   '-o', 'StrictHostKeyChecking=no',
+                   '-o', 'BatchMode=yes',
+                   '-o', 'ControlMaster=yes',
+                   '-o', 'ControlPath={}'.format(control_path),
+                   '-o', 'ControlPersist={}'.format(
+                       CONF.ssh.control_persist),
+                   '-N', '-f', target]
+        with open(os.devnull, 'w') as devnull:
+            return_code = subprocess.call(command, stdout=devnull,
+                                          stderr=devnull)
+
+    if return_code:
+        LOG.warning("Could not start shared connection to jumpbox {}, "
+                    "connecting directly".format(jumpbox_ip))
+        return None
+    return control_path
+
+
+def proxy_command(jumpbox_ip, jumpbox_key_file):
+    """Returns the ProxyCommand hopping through the jumpbox
+
+    The hop uses the shared jumpbox connection if there is one. The key is
+    still passed, so the hop falls back to a new connection if the shared one
+    went away.
+    """
+    control_path = jumpbox_master(jumpbox_ip, jumpbox_key_file)
+    if control_path is None:
+        return 'ssh -q -i "{}" -W %h:%p {}@{}'.format(jumpbox_key_file,
+                                                      SSH_USER, jumpbox_ip)
+
+    return 'ssh -q -i "{}" -o ControlPath="{}" -W %h:%p {}@{}'.format(
+        jumpbox_key_file, control_path, SSH_USER, jumpbox_ip)
+
+
+def ssh_command(ip, private_key_file, jumpbox_ip, jumpbox_key_file,
+                options=None):
+    """Builds the argument list of an ssh command to a node
+
+    The connection goes through the jumpbox, options are additional ssh -o
+    options.
+    """
+    command = ['ssh', '-i', private_key_file,
+               '-o', 'ProxyCommand={}'.format(
+                   proxy_command(jumpbox_ip, jumpbox_key_file)),
+               '-o', 'StrictHostKeyChecking=no']
+    for option in options or []:
+        command.extend(['-o', option])
+    command.append('{}@{}'.format(SSH_USER, ip))
+    return command
+
+
+def jumpbox_command(jumpbox_ip, jumpbox_key_file):
+    """Builds the argument list of an ssh command to the jumpbox itself"""
+    command = ['ssh', '-q', '-i', jumpbox_key_file,
+               '-o', 'StrictHostKeyChecking=no',
+               '-o', 'BatchMode=yes']
+    control_path = jumpbox_master(jumpbox_ip, jumpbox_key_file)
+    if control_path is not None:
+        command.extend(['-o', 'ControlPath={}'.format(control_path)])
+    command.append('{}@{}'.format(SSH_USER, jumpbox_ip))
+    return command
+
+
+def _communicate(command, remote_command, input):
+    process = subprocess.Popen(command + [remote_command],
+                               stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate(input)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode,
+                                            remote_command, stderr)
+    return stdout
+
+
+def run(ip, private_key_file, jumpbox_ip, jumpbox_key_file, remote_command,
+        input=None):
+    """Runs a command on a node and returns its output"""
+    command = ssh_command(ip, private_key_file, jumpbox_ip, jumpbox_key_file,
+                          ['BatchMode=yes', 'UserKnownHostsFile=/dev/null'])
+    return _communicate(command, remote_command, input)
+
+
+def run_on_jumpbox(jumpbox_ip, jumpbox_key_file, remote_command, input=None):
+    """Runs a command on the jumpbox and returns its output"""
+    command = jumpbox_command(jumpbox_ip, jumpbox_key_file)
+    return _communicate(command, remote_command, input)
+
+
+def pipe(source_command, sink_command):
+    """Streams the output of one command into another one
+
+    Both are argument lists, typically ssh commands. Returns the output of
+    the sink.
+    """
+    with open(os.devnull, 'w') as devnull:
+        source = subprocess.Popen(source_command, stdout=subprocess.PIPE,
+                                  stderr=devnull)
+        sink = subprocess.Popen(sink_command, stdin=source.stdout,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        # The sink owns the pipe now, so that the source gets SIGPIPE if the
+        # sink exits early
+        source.stdout.close()
+        stdout, stderr = sink.communicate()
+        source.wait()
+
+    if source.returncode:
+        raise subprocess.CalledProcessError(source.returncode,
+                                            source_command[-1])
+    if sink.returncode:
+        raise subprocess.CalledProcessError(sink.returncode,
+                                            sink_command[-1], stderr)
+    return stdout
+
+
+def _free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+def _wait_for_port(process, port):
+    deadline = time.time() + TUNNEL_TIMEOUT
+    while True:
+        if process.poll() is not None:
+            raise Exception('Port forwarding exited with {}'.format(
+                process.returncode))
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return
+        except socket.error:
+            if time.time() > deadline:
+                raise Exception('Timeout while forwarding port {}'.format(
+                    port))
+            time.sleep(0.2)
+
+
+@contextlib.contextmanager
+def tunnel(ip, private_key_file, jumpbox_ip, jumpbox_key_file, remote_port):
+    """Forwards a local port to a port on the loopback interface of a node
+
+    Yields the local port.
+    """
+    local_port = _free_port()
+    command = ssh_command(ip, private_key_file, jumpbox_ip, jumpbox_key_file,
+                          ['BatchMode=yes', 'UserKnownHostsFile=/dev/null',
+                           'ExitOnForwardFailure=yes'])
+    command[-1:-1] = ['-N', '-L',
+                      '{}:127.0.0.1:{}'.format(local_port, remote_port)]
+
+    with open(os.devnull, 'w') as devnull:
+        process = subprocess.Popen(command, stdout=devnull, stderr=devnull)
+    try:
+        _wait_for_port(process, local_port)
+        yield local_port
+    finally:
+        if process.poll() is None:
+            process.terminate()
+        process.wait()
+
+
+def key_dir():
+    """Returns the directory decrypted keys are written to
+
+    This is a tmpfs by default, so the keys never touch the disk.
+    """
+    if CONF.ssh.key_dir:
+        return os.path.expanduser(CONF.ssh.key_dir)
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+    return os.path.expanduser('~/.ssh')
+
+
+@contextlib.contextmanager
+def private_key_files(*encrypted_keys):
+    """Decrypts the keys into temporary files and yields their paths"""
+    directory = key_dir()
+    key_files = []
+    try:
+        # We can assume that this is safe because Python makes use of
+        # O_EXCL: https://docs.python.org/2/library/tempfile.html#tempfile
+        # .mkstemp
+        for encrypted_key in encrypted_keys:
+            key_file = tempfile.NamedTemporaryFile(dir=directory,
+                                                   prefix='catena-')
+            key_files.append(key_file)
+            decrypt_private_key(encrypted_key, key_file)
+        yield [key_file.name for key_file in key_files]
+    finally:
+        for key_file in key_files:
+            key_file.close()
@@ -0,0 +1,109 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compact time series kept at several resolutions
+
+Each resolution is a ring buffer of a fixed number of points, so the size
+of a series is bounded no matter how long it is recorded. The finest
+resolution keeps every sample, coarser ones aggregate all samples of a
+bucket of step seconds into a single point once the bucket is complete.
+"""
+
+import collections
+
+
+def mean(values):
+    return float(sum(values)) / len(values)
+
+
+class TimeSeries(object):
+    """A series of samples of several fields
+
+    fields are (name, aggregate) pairs, the aggregate reduces the values of
+    a field in a bucket to one value. resolutions are (step, size) pairs,
+    ordered from the finest to the coarsest, a step of 0 keeps every
+    sample. Points are lists of the timestamp and the field values.
+    """
+
+    def __init__(self, fields, resolutions):
+        self.fields = fields
+        self.resolutions = resolutions
+        self._points = [collections.deque(maxlen=size)
+                        for _, size in resolutions]
+        # The samples of the current bucket of every resolution
+        self._buckets = [[] for _ in resolutions]
+
+    @classmethod
+    def from_dict(cls, fields, resolutions, data):
+        """Restores a series saved by to_dict
+
+        The data is discarded if it was recorded with other fields or
+        resolutions.
+        """
+        series = cls(fields, resolutions)
+        if not data or data['fields'] != series.field_names():
+            return series
+        saved = [(resolution['step'], resolution['size'])
+                 for resolution in data['resolutions']]
+        if saved != [tuple(resolution) for resolution in resolutions]:
+            return series
+
+        for index, resolution in enumerate(data['resolutions']):
+            series._points[index].extend(resolution['points'])
+            series._buckets[index] = resolution['bucket']
+        return series
+
+    def field_names(self):
+        return [name for name, _ in self.fields]
+
+    def add(self, timestamp, sample):
+        """Adds a sample, a dict of values by field name
+
+        A value of None marks a field without value, these are left out of
+        the aggregates.
+        """
+        point = [timestamp] + [sample.get(name) for name, _ in self.fields]
+
+        for index, (step, _) in enumerate(self.resolutions):
+            if not step:
+                self._points[index].append(point)
+                continue
+
+            bucket = self._buckets[index]
+            if bucket and timestamp // step != bucket[0][0] // step:
+                self._points[index].append(self._aggregate(bucket, step))
+                del bucket[:]
+            bucket.append(point)
+
+    def _aggregate(self, bucket, step):
+        aggregated = [bucket[0][0] // step * step]
+        for column, (_, aggregate) in enumerate(self.fields, 1):
+            values = [point[column] for point in bucket
+                      if point[column] is not None]
+            aggregated.append(aggregate(values) if values else None)
+        return aggregated
+
+    def to_dict(self):
+        return {
+            'fields': self.field_names(),
+            'resolutions': [{
+                'step': step,
+                'size': size,
+                'points': list(points),
+                'bucket': bucket
+            } for (step, size), points, bucket in zip(
+                self.resolutions, self._points, self._buckets)]
+        }
@@ -13,15 +13,39 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
 import json
+import threading
 
 from oslo_db.sqlalchemy import enginefacade
+from oslo_db.sqlalchemy import utils as sqlalchemyutils
 from oslo_log import log as logging
+from sqlalchemy import and_
+from sqlalchemy import event
+from sqlalchemy import func
+from sqlalchemy import or_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import undefer_group
 
 from catena.db.sqlalchemy import models
 
 LOG = logging.getLogger(__name__)
 
+CHAIN_FILTERS = ('status', 'owner')
+CLOUD_FILTERS = ('type',)
+
+# The relations callers can ask get_chain(s) to load along with the chains.
+# The cloud is joined into the query, the nodes of all chains are loaded with
+# a single second query instead of a query per chain.
+CHAIN_LOADERS = {
+    'cloud': joinedload,
+    'nodes': selectinload,
+}
+
+_query_counters = threading.local()
+
 
 # See documentation: https://docs.openstack.org/oslo.db/latest/user/usage
 # .html#session-handling
@@ -35,39 +59,132 @@ def get_context():
     return MyContext()
 
 
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    for queries in getattr(_query_counters, 'active', ()):
+        queries.append(statement)
+
+
+@contextlib.contextmanager
+def count_queries():
+    """Records the statements the current thread executes
+
+    Yields the list the statements are appended to, so that tests can assert
+    the number of round trips a call makes:
+
+        with db_api.count_queries() as queries:
+            service.get_nodes(chain_id)
+        self.assertEqual(1, len(queries))
+    """
+    if not hasattr(_query_counters, 'active'):
+        _query_counters.active = []
+
+    queries = []
+    _query_counters.active.append(queries)
+    try:
+        yield queries
+    finally:
+        _query_counters.active.remove(queries)
+
+
+def _load_options(model, loaders, load):
+    options = [undefer_group(models.BLOBS)]
+    for name in load or ():
+        assert name in loaders, "Cannot load {}".format(name)
+        options.append(loaders[name](getattr(model, name)).undefer_group(
+            models.BLOBS))
+    return options
+
+
+def _paginate_query(context, query, model, marker, limit, sort_key,
+                    sort_dir):
+    """Applies keyset pagination to a query
+
+    The id is always added as the last sort key, which makes the sort order
+    unique and lets the marker be resolved without an offset.
+    """
+    sort_keys = list(sort_key)
+    if 'id' not in sort_keys:
+        sort_keys.append('id')
+
+    if marker is not None:
+        marker_ref = context.session.query(model).get(marker)
+        if marker_ref is None:
+            raise ValueError('Marker {} does not exist'.format(marker))
+        marker = marker_ref
+
+    return sqlalchemyutils.paginate_query(query, model, limit, sort_keys,
+                                          marker=marker, sort_dir=sort_dir)
+
+
+def _filter_query(query, model, filters, allowed):
+    for key, value in filters.items():
+        if key not in allowed:
+            raise ValueError('Cannot filter by {}'.format(key))
+        query = query.filter(getattr(model, key) == value)
+    return query
+
+
+def _list_query(context, model, columns):
+    """Queries only the given columns, or whole rows including blobs"""
+    if columns:
+        return context.session.query(
+            *[getattr(model, column) for column in columns])
+    return context.session.query(model).options(undefer_group(models.BLOBS))
+
+
+def _to_dicts(query, columns):
+    if columns:
+        return [dict(zip(columns, row)) for row in query.all()]
+    return [ref.to_dict() for ref in query.all()]
+
+
 @enginefacade.reader
 def get_chains(context, filters=None, marker=None, limit=None, sort_key=None,
-               sort_dir=None):
+               sort_dir=None, columns=None):
     sort_key = ['created_at'] if not sort_key else sort_key
     if not sort_dir:
         sort_dir = 'desc'
 
     filters = filters or {}
-    chains = []
-    chains_query = context.session.query(models.Chain)
-    for chain in chains_query.all():
-        chain = chain.to_dict()
-        chains.append(chain)
-    return chains
+    chains_query = _list_query(context, models.Chain, columns)
+    chains_query = _filter_query(chains_query, models.Chain, filters,
+                                 CHAIN_FILTERS)
+    chains_query = _paginate_query(context, chains_query, models.Chain,
+                                   marker, limit, sort_key, sort_dir)
+    return _to_dicts(chains_query, columns)
+
+
+@enginefacade.reader
+def get_chain_models(context, filters=None, load=None):
+    """Returns the chains as models, with the relations in load loaded
+
+    See CHAIN_LOADERS for the relations that can be loaded.
+    """
+    query = context.session.query(models.Chain).options(
+        *_load_options(models.Chain, CHAIN_LOADERS, load))
+    query = _filter_query(query, models.Chain, filters or {}, CHAIN_FILTERS)
+    return query.order_by(models.Chain.created_at).all()
 
 
 @enginefacade.reader
-def get_chain(context, chain_id):
-    blockchain = context.session.query(models.Chain).get(chain_id)
-    return blockchain
+def get_chain(context, chain_id, load=None):
+    """Returns the chain, with the relations in load loaded
+
+    Loaded relations can still be used after the session has been closed.
+    See CHAIN_LOADERS for the relations that can be loaded.
+    """
+    return context.session.query(models.Chain).options(
+        *_load_options(models.Chain, CHAIN_LOADERS, load)).get(chain_id)
 
 
 @enginefacade.reader
-def get_nodes(context, chain, raw=False):
-    nodes = []
-    nodes_query = context.session.query(models.ChainNodes).filter(
-        models.ChainNodes.chain_id == chain.id)
+def get_nodes(context, chain_id, raw=False, columns=None):
+    nodes_query = _list_query(context, models.ChainNodes, columns).filter(
+        models.ChainNodes.chain_id == chain_id)
     if raw:
         return nodes_query
-    for node in nodes_query.all():
-        node = node.to_dict()
-        nodes.append(node)
-    return nodes
+    return _to_dicts(nodes_query, columns)
 
 
 @enginefacade.writer
@@ -86,50 +203,77 @@ def create_chain(context, name, backend, cloud, chain_config, cloud_config):
 
 
 @enginefacade.writer
-def create_node(context, id, chain, ip, ssh_key, name, type):
+def create_node(context, id, chain, ip, ssh_key, name, type, status=None,
+                flavour=None, chain_config=None):
     node_ref = models.ChainNodes()
     node_ref.id = id
-    node_ref.chain = chain
+    # Only the foreign key is set, so that the (possibly shared) chain isn't
+    # attached to this session
+    node_ref.chain_id = chain.id
     node_ref.ip = ip
     node_ref.ssh_key = ssh_key
     node_ref.name = name
     node_ref.type = type
+    node_ref.status = status
+    node_ref.flavour = flavour
+    if chain_config:
+        node_ref.set_chain_config(chain_config)
 
     node_ref.save(context)
     return node_ref
 
 
+@enginefacade.writer
+def delete_node(context, node_id):
+    context.session.query(models.ChainNodes).filter(
+        models.ChainNodes.id == node_id).delete(synchronize_session=False)
+    context.session.query(models.NodeMetrics).filter(
+        models.NodeMetrics.node_id == node_id).delete(
+        synchronize_session=False)
+
+
 @enginefacade.reader
 def get_node(context, chain, node_id):
-    return context.session.query(models.ChainNodes).get(node_id)
+    return context.session.query(models.ChainNodes).options(
+        undefer_group(models.BLOBS)).get(node_id)
 
 
 @enginefacade.reader
 def get_controller_node(context, chain):
-    return context.session.query(models.ChainNodes).filter(
+    return context.session.query(models.ChainNodes).options(
+        undefer_group(models.BLOBS)).filter(
         models.ChainNodes.chain_id == chain.id).filter(
         models.ChainNodes.type == 'controller').one()
 
 
+@enginefacade.reader
+def get_enodes(context, chain_id):
+    query = context.session.query(models.ChainNodes.enode).filter(
+        models.ChainNodes.chain_id == chain_id).filter(
+        models.ChainNodes.enode.isnot(None))
+    return [enode for enode, in query.all()]
+
+
 @enginefacade.reader
 def get_clouds(context, filters=None, marker=None, limit=None, sort_key=None,
-               sort_dir=None):
+               sort_dir=None, columns=None):
     sort_key = ['created_at'] if not sort_key else sort_key
     if not sort_dir:
         sort_dir = 'desc'
 
     filters = filters or {}
-    chains = []
-    chains_query = context.session.query(models.Cloud)
-    for chain in chains_query.all():
-        chain = chain.to_dict()
-        chains.append(chain)
-    return chains
+    clouds_query = _list_query(context, models.Cloud, columns)
+    clouds_query = _filter_query(clouds_query, models.Cloud, filters,
+                                 CLOUD_FILTERS)
+    clouds_query = _paginate_query(context, clouds_query, models.Cloud,
+                                   marker, limit, sort_key, sort_dir)
+    return _to_dicts(clouds_query, columns)
 
 
 @enginefacade.reader
 def get_cloud(context, cloud_id):
-    return context.session.query(models.Cloud).get(cloud_id)
+    return context.session.query(models.Cloud).options(
+        undefer_group(models.BLOBS)).get(cloud_id)
 
 
 @enginefacade.writer
@@ -139,3 +283,303 @@ def create_cloud(context, type):
 
     cloud_ref.save(context)
     return cloud_ref
+
+
+@enginefacade.writer
+def create_job(context, action, args, resource_id=None):
+    job_ref = models.Job()
+    job_ref.action = action
+    job_ref.status = 'pending'
+    job_ref.resource_id = resource_id
+    job_ref.set_args(args)
+
+    job_ref.save(context)
+    return job_ref
+
+
+@enginefacade.reader
+def get_job(context, job_id):
+    return context.session.query(models.Job).get(job_id)
+
+
+def _claimable(query, expired_before):
+    return query.filter(or_(
+        models.Job.status == 'pending',
+        and_(models.Job.status == 'running',
+             or_(models.Job.heartbeat_at.is_(None),
+                 models.Job.heartbeat_at < expired_before))))
+
+
+@enginefacade.writer
+def claim_job(context, job_id, now, expired_before):
+    """Atomically move a pending job, or one whose lease expired, to running.
+
+    Returns False if the job was already claimed by another worker.
+    """
+    count = _claimable(context.session.query(models.Job).filter(
+        models.Job.id == job_id), expired_before).update(
+        {'status': 'running', 'heartbeat_at': now},
+        synchronize_session=False)
+    return count == 1
+
+
+@enginefacade.writer
+def renew_jobs(context, job_ids, now):
+    """Renews the lease of running jobs"""
+    context.session.query(models.Job).filter(
+        models.Job.id.in_(job_ids)).filter(
+        models.Job.status == 'running').update(
+        {'heartbeat_at': now}, synchronize_session=False)
+
+
+@enginefacade.reader
+def get_claimable_job_ids(context, expired_before):
+    """Returns the pending jobs and the running jobs whose lease expired"""
+    query = _claimable(context.session.query(models.Job.id),
+                       expired_before).order_by(models.Job.created_at)
+    return [job_id for job_id, in query.all()]
+
+
+@enginefacade.writer
+def update_job(context, job_id, values):
+    context.session.query(models.Job).filter(
+        models.Job.id == job_id).update(values, synchronize_session=False)
+
+
+@enginefacade.writer
+def create_pooled_node(context, id, cloud_id, flavour, network, jumpbox,
+                       ssh_key):
+    pooled_ref = models.PooledNode()
+    pooled_ref.id = id
+    pooled_ref.cloud_id = cloud_id
+    pooled_ref.flavour = flavour
+    pooled_ref.network = network
+    pooled_ref.jumpbox = jumpbox
+    pooled_ref.ssh_key = ssh_key
+    pooled_ref.status = 'booting'
+
+    pooled_ref.save(context)
+    return pooled_ref
+
+
+@enginefacade.writer
+def update_pooled_node(context, pooled_id, values):
+    context.session.query(models.PooledNode).filter(
+        models.PooledNode.id == pooled_id).update(
+        values, synchronize_session=False)
+
+
+@enginefacade.writer
+def delete_pooled_node(context, pooled_id):
+    context.session.query(models.PooledNode).filter(
+        models.PooledNode.id == pooled_id).delete(synchronize_session=False)
+
+
+@enginefacade.reader
+def count_pooled_nodes(context, cloud_id, flavour, network, jumpbox):
+    """Counts the VMs of a pool that are ready or still booting"""
+    return context.session.query(models.PooledNode).filter(
+        models.PooledNode.cloud_id == cloud_id).filter(
+        models.PooledNode.flavour == flavour).filter(
+        models.PooledNode.network == network).filter(
+        models.PooledNode.jumpbox == jumpbox).filter(
+        models.PooledNode.status.in_(('booting', 'ready'))).count()
+
+
+@enginefacade.writer
+def claim_pooled_node(context, cloud_id, flavour, network, jumpbox):
+    """Atomically removes the oldest ready VM from a pool.
+
+    Returns the removed VM, or None if the pool is empty.
+    """
+    candidates = context.session.query(models.PooledNode).options(
+        undefer_group(models.BLOBS)).filter(
+        models.PooledNode.cloud_id == cloud_id).filter(
+        models.PooledNode.flavour == flavour).filter(
+        models.PooledNode.network == network).filter(
+        models.PooledNode.jumpbox == jumpbox).filter(
+        models.PooledNode.status == 'ready').order_by(
+        models.PooledNode.created_at).limit(5).all()
+
+    for pooled in candidates:
+        count = context.session.query(models.PooledNode).filter(
+            models.PooledNode.id == pooled.id).filter(
+            models.PooledNode.status == 'ready').delete(
+            synchronize_session=False)
+        if count == 1:
+            return pooled
+    return None
+
+
+@enginefacade.writer
+def claim_expired_pooled_nodes(context, cloud_id, network, jumpbox, before):
+    """Atomically marks the VMs of a pool created before a date as reaping.
+
+    VMs that are already reaping are returned again, so that a reap that
+    failed half-way is retried.
+    """
+    expired = context.session.query(models.PooledNode).filter(
+        models.PooledNode.cloud_id == cloud_id).filter(
+        models.PooledNode.network == network).filter(
+        models.PooledNode.jumpbox == jumpbox).filter(
+        models.PooledNode.created_at < before).all()
+
+    claimed = []
+    for pooled in expired:
+        count = context.session.query(models.PooledNode).filter(
+            models.PooledNode.id == pooled.id).filter(
+            models.PooledNode.status == pooled.status).update(
+            {'status': 'reaping'}, synchronize_session=False)
+        if count == 1:
+            claimed.append(pooled)
+    return claimed
+
+
+@enginefacade.writer
+def create_snapshot(context, chain_id, path):
+    snapshot_ref = models.ChainSnapshot()
+    snapshot_ref.chain_id = chain_id
+    snapshot_ref.path = path
+    snapshot_ref.status = 'creating'
+
+    snapshot_ref.save(context)
+    return snapshot_ref
+
+
+@enginefacade.writer
+def update_snapshot(context, snapshot_id, values):
+    context.session.query(models.ChainSnapshot).filter(
+        models.ChainSnapshot.id == snapshot_id).update(
+        values, synchronize_session=False)
+
+
+@enginefacade.writer
+def delete_snapshot(context, snapshot_id):
+    context.session.query(models.ChainSnapshot).filter(
+        models.ChainSnapshot.id == snapshot_id).delete(
+        synchronize_session=False)
+
+
+@enginefacade.reader
+def get_snapshots(context, chain_id, status='available'):
+    """Returns the snapshots of a chain, newest first"""
+    return context.session.query(models.ChainSnapshot).filter(
+        models.ChainSnapshot.chain_id == chain_id).filter(
+        models.ChainSnapshot.status == status).order_by(
+        models.ChainSnapshot.created_at.desc()).all()
+
+
+@enginefacade.reader
+def get_stale_snapshots(context, before):
+    """Returns the snapshots of all chains still being created since before"""
+    return context.session.query(models.ChainSnapshot).filter(
+        models.ChainSnapshot.status == 'creating').filter(
+        models.ChainSnapshot.created_at < before).all()
+
+
+@enginefacade.reader
+def get_latest_snapshot(context, chain_id):
+    return context.session.query(models.ChainSnapshot).filter(
+        models.ChainSnapshot.chain_id == chain_id).filter(
+        models.ChainSnapshot.status == 'available').order_by(
+        models.ChainSnapshot.created_at.desc()).first()
+
+
+@enginefacade.reader
+def get_latest_snapshot_dates(context):
+    """Returns the date of the latest available snapshot by chain id"""
+    query = context.session.query(
+        models.ChainSnapshot.chain_id,
+        func.max(models.ChainSnapshot.created_at)).filter(
+        models.ChainSnapshot.status == 'available').group_by(
+        models.ChainSnapshot.chain_id)
+    return dict(query.all())
+
+
+@enginefacade.writer
+def create_benchmark(context, chain_id, rate, duration):
+    benchmark_ref = models.Benchmark()
+    benchmark_ref.chain_id = chain_id
+    benchmark_ref.rate = rate
+    benchmark_ref.duration = duration
+    benchmark_ref.status = 'running'
+
+    benchmark_ref.save(context)
+    return benchmark_ref
+
+
+@enginefacade.reader
+def get_benchmark(context, benchmark_id):
+    return context.session.query(models.Benchmark).get(benchmark_id)
+
+
+@enginefacade.writer
+def update_benchmark(context, benchmark_id, values):
+    context.session.query(models.Benchmark).filter(
+        models.Benchmark.id == benchmark_id).update(
+        values, synchronize_session=False)
+
+
+@enginefacade.reader
+def get_benchmarks(context, chain_id):
+    """Returns the benchmarks of a chain, newest first"""
+    return context.session.query(models.Benchmark).filter(
+        models.Benchmark.chain_id == chain_id).order_by(
+        models.Benchmark.created_at.desc()).all()
+
+
+@enginefacade.reader
+def get_node_metrics(context, node_id):
+    return context.session.query(models.NodeMetrics).get(node_id)
+
+
+@enginefacade.writer
+def save_node_metrics(context, node_id, chain_id, series):
+    """Saves the series of a node, returns False if the node was deleted
+
+    The node row is locked until the series is saved, so delete_node either
+    waits and deletes the new series, or runs first and nothing is saved.
+    """
+    node = context.session.query(models.ChainNodes.id).filter(
+        models.ChainNodes.id == node_id).with_for_update(read=True).first()
+    if node is None:
+        return False
+
+    metrics_ref = context.session.query(models.NodeMetrics).get(node_id)
+    if metrics_ref is None:
+        metrics_ref = models.NodeMetrics()
+        metrics_ref.node_id = node_id
+        metrics_ref.chain_id = chain_id
+    metrics_ref.set_series(series)
+
+    metrics_ref.save(context)
+    return True
+
+
+@enginefacade.reader
+def get_column_batch(context, model, column, after_id, limit):
+    """Returns (id, value) of the rows following after_id, ordered by id
+
+    Used to walk through a whole table without loading it at once.
+    """
+    query = context.session.query(model.id, getattr(model, column)).order_by(
+        model.id)
+    if after_id is not None:
+        query = query.filter(model.id > after_id)
+    return query.limit(limit).all()
+
+
+@enginefacade.writer
+def update_column_values(context, model, column, updates):
+    """Replaces values in a single transaction
+
+    updates are (id, old value, new value). Rows whose value changed in the
+    meantime are left alone. Returns the number of updated rows.
+    """
+    count = 0
+    for id, old, new in updates:
+        count += context.session.query(model).filter(
+            model.id == id).filter(
+            getattr(model, column) == old).update(
+            {column: new}, synchronize_session=False)
+    return count
@@ -17,26 +17,34 @@
 Catena Models!
 """
 
+import itertools
 import json
 import uuid
 
 from oslo_db.sqlalchemy import enginefacade
 from oslo_db.sqlalchemy import models
 from oslo_serialization import jsonutils
+from sqlalchemy import BigInteger
 from sqlalchemy import Boolean
 from sqlalchemy import Column
 from sqlalchemy import DateTime
 from sqlalchemy import Enum
+from sqlalchemy import event
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Float
 from sqlalchemy import ForeignKey
 from sqlalchemy import Index
+from sqlalchemy import Integer
+from sqlalchemy.orm import attributes
+from sqlalchemy.orm import deferred
 from sqlalchemy.orm import relationship
+from sqlalchemy.orm import Session
 from sqlalchemy import String
 from sqlalchemy import Text
 from sqlalchemy.types import TypeDecorator
 
 from catena.common import utils
-from catena.common.utils import decrypt_private_rsakey
+from catena.common.utils import decrypt_private_key
 
 BASE = declarative_base()
 
@@ -57,6 +65,11 @@ class JSONEncodedDict(TypeDecorator):
         return value
 
 
+# Large or secret Text columns are deferred into this group, so that they are
+# only loaded by queries that undefer it (see catena.db.sqlalchemy.api)
+BLOBS = 'blobs'
+
+
 class CatenaBase(models.ModelBase, models.TimestampMixin):
     """Base class for Glance Models."""
 
@@ -107,15 +120,69 @@ class CatenaBase(models.ModelBase, models.TimestampMixin):
         # It is not serializable
         # and causes CircularReference
         d.pop("_sa_instance_state")
+        d.pop("_json_values", None)
         return d
 
 
-class Chain(BASE, CatenaBase):
+class JSONColumnsMixin(object):
+    """Parses JSON Text columns once and serializes them on flush
+
+    The getters return the same dict until the column changes, so callers
+    must not modify it unless they pass it to the setter afterwards. The
+    setters only keep the dict, it is serialized when the object is flushed
+    (see _serialize_json_columns). Configs like the genesis of a chain are
+    read many times while provisioning and written a few times.
+    """
+
+    # Marks a value that was set but not yet serialized
+    _PENDING = object()
+
+    def _json_cache(self):
+        return self.__dict__.setdefault('_json_values', {})
+
+    def _get_json(self, column, default=None):
+        cached = self._json_cache().get(column)
+        if cached is not None and (cached[0] is self._PENDING or
+                                   cached[0] is getattr(self, column)):
+            return cached[1]
+
+        raw = getattr(self, column)
+        if not raw:
+            return default
+        value = json.loads(raw)
+        self._json_cache()[column] = (raw, value)
+        return value
+
+    def _set_json(self, column, value):
+        self._json_cache()[column] = (self._PENDING, value)
+        # Nothing SQLAlchemy tracks changed yet, this makes the next flush
+        # (and so the listener) include the object
+        attributes.flag_dirty(self)
+
+    def serialize_json_columns(self):
+        cache = self._json_cache()
+        for column, (raw, value) in list(cache.items()):
+            if raw is self._PENDING:
+                raw = json.dumps(value)
+                setattr(self, column, raw)
+                cache[column] = (raw, value)
+
+
+@event.listens_for(Session, 'before_flush')
+def _serialize_json_columns(session, flush_context, instances):
+    for instance in itertools.chain(session.new,
+                                    session.identity_map.values()):
+        if isinstance(instance, JSONColumnsMixin):
+            instance.serialize_json_columns()
+
+
+class Chain(BASE, CatenaBase, JSONColumnsMixin):
     """Represents an image in the datastore."""
     __tablename__ = 'chains'
     __table_args__ = (
         Index('ix_chain_deleted', 'deleted'),
         Index('owner_chain_idx', 'owner'),
+        Index('status_chain_idx', 'status'),
         Index('created_at_chain_idx', 'created_at'),
         Index('updated_at_chain_idx', 'updated_at'),
         {
@@ -144,28 +211,46 @@ class Chain(BASE, CatenaBase):
         back_populates='chain',
         cascade="all, delete, delete-orphan")
 
-    cloud_config = Column(Text())
-    chain_config = Column(Text())
+    cloud_config = deferred(Column(Text()), group=BLOBS)
+    chain_config = deferred(Column(Text()), group=BLOBS)
+
+    snapshots = relationship(
+        'ChainSnapshot',
+        back_populates='chain',
+        cascade="all, delete, delete-orphan")
+
+    benchmarks = relationship(
+        'Benchmark',
+        back_populates='chain',
+        cascade="all, delete, delete-orphan")
 
     status = Column(String(30), nullable=False)
     owner = Column(String(255))
 
     def get_chain_config(self):
-        return json.loads(self.chain_config)
+        return self._get_json('chain_config')
 
     def get_cloud_config(self):
-        return json.loads(self.cloud_config)
+        return self._get_json('cloud_config')
 
     def set_chain_config(self, chain_config):
-        self.chain_config = json.dumps(chain_config)
+        self._set_json('chain_config', chain_config)
 
     def set_cloud_config(self, cloud_config):
-        self.cloud_config = json.dumps(cloud_config)
+        self._set_json('cloud_config', cloud_config)
 
 
-class ChainNodes(BASE, CatenaBase):
+class ChainNodes(BASE, CatenaBase, JSONColumnsMixin):
     """Represents an image properties in the datastore."""
     __tablename__ = 'chain_nodes'
+    __table_args__ = (
+        Index('enode_chain_nodes_idx', 'chain_id', 'enode',
+              mysql_length={'enode': 200}),
+        {
+            'mysql_engine': 'InnoDB',
+            'mysql_charset': 'utf8'
+        }
+    )
 
     id = Column(String(36),
                 primary_key=True,
@@ -179,27 +264,38 @@ class ChainNodes(BASE, CatenaBase):
 
     type = Column(Text())
 
-    chain_config = Column(Text())
+    chain_config = deferred(Column(Text()), group=BLOBS)
+
+    ssh_key = deferred(Column(Text()), group=BLOBS)
+    ip = Column(String(16))
+    flavour = Column(String(255))
+
+    # Last committed provisioning step, see catena.service.service.NODE_STEPS
+    status = Column(String(30))
 
-    ssh_key = Column(Text())
-    ip = Column(String(16), nullable=False)
+    # The URL other nodes use to connect to this node, set once provisioned
+    enode = Column(String(255))
 
     def get_ssh_key(self, file):
-        return decrypt_private_rsakey(self.ssh_key, file)
+        return decrypt_private_key(self.ssh_key, file)
 
     def get_chain_config(self):
-        if self.chain_config:
-            return json.loads(self.chain_config)
-        else:
-            return {}
+        return self._get_json('chain_config', {})
 
     def set_chain_config(self, chain_config):
-        self.chain_config = json.dumps(chain_config)
+        self._set_json('chain_config', chain_config)
 
 
-class Cloud(BASE, CatenaBase):
+class Cloud(BASE, CatenaBase, JSONColumnsMixin):
     """Represents a cloud in the datastore"""
     __tablename__ = 'clouds'
+    __table_args__ = (
+        Index('created_at_cloud_idx', 'created_at'),
+        {
+            'mysql_engine': 'InnoDB',
+            'mysql_charset': 'utf8'
+        }
+    )
 
     id = Column(String(36),
                 primary_key=True,
@@ -209,26 +305,192 @@ class Cloud(BASE, CatenaBase):
     type = Column(Text())
     name = Column(Text())
 
-    authentication = Column(Text())
-    cloud_config = Column(Text())
+    authentication = deferred(Column(Text()), group=BLOBS)
+    cloud_config = deferred(Column(Text()), group=BLOBS)
 
     def get_authentication(self):
-        return json.loads(self.authentication)
+        return self._get_json('authentication')
 
     def set_authentication(self, authentication):
-        self.authentication = json.dumps(authentication)
+        self._set_json('authentication', authentication)
 
     def get_cloud_config(self):
-        return json.loads(self.cloud_config)
+        return self._get_json('cloud_config')
 
     def set_cloud_config(self, cloud_config):
-        self.cloud_config = json.dumps(cloud_config)
+        self._set_json('cloud_config', cloud_config)
+
+
+class Job(BASE, CatenaBase):
+    """Represents an asynchronous job in the datastore"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        Index('status_job_idx', 'status'),
+        {
+            'mysql_engine': 'InnoDB',
+            'mysql_charset': 'utf8'
+        }
+    )
+
+    id = Column(String(36),
+                primary_key=True,
+                default=lambda: str(uuid.uuid4()))
+
+    action = Column(String(64), nullable=False)
+    status = Column(String(30), nullable=False)
+    resource_id = Column(String(36))
+    progress = Column(String(255))
+    # Renewed while the job runs, a running job whose heartbeat expired is
+    # taken over by another API process
+    heartbeat_at = Column(DateTime)
+
+    args = Column(Text())
+    result = Column(Text())
+    error = Column(Text())
+
+    def get_args(self):
+        return json.loads(self.args)
+
+    def set_args(self, args):
+        self.args = json.dumps(args)
+
+    def get_result(self):
+        if self.result:
+            return json.loads(self.result)
+        else:
+            return {}
+
+    def set_result(self, result):
+        self.result = json.dumps(result)
+
+
+class Benchmark(BASE, CatenaBase):
+    """Represents a load test run against a chain"""
+    __tablename__ = 'benchmarks'
+    __table_args__ = (
+        Index('chain_benchmark_idx', 'chain_id', 'created_at'),
+        {
+            'mysql_engine': 'InnoDB',
+            'mysql_charset': 'utf8'
+        }
+    )
+
+    id = Column(String(36),
+                primary_key=True,
+                default=lambda: str(uuid.uuid4()))
+
+    chain_id = Column(String(36), ForeignKey('chains.id'), nullable=False)
+    chain = relationship('Chain', back_populates='benchmarks')
+
+    # One of 'running', 'succeeded' or 'failed'
+    status = Column(String(30), nullable=False)
+
+    # Target transactions per second and seconds of load
+    rate = Column(Float, nullable=False)
+    duration = Column(Integer, nullable=False)
+
+    result = Column(Text())
+    error = Column(Text())
+
+    def get_result(self):
+        if self.result:
+            return json.loads(self.result)
+        else:
+            return {}
+
+    def set_result(self, result):
+        self.result = json.dumps(result)
+
+
+class ChainSnapshot(BASE, CatenaBase):
+    """Represents a chaindata archive of a chain stored on its jumpbox"""
+    __tablename__ = 'chain_snapshots'
+    __table_args__ = (
+        Index('chain_snapshot_idx', 'chain_id', 'status', 'created_at'),
+        {
+            'mysql_engine': 'InnoDB',
+            'mysql_charset': 'utf8'
+        }
+    )
+
+    id = Column(String(36),
+                primary_key=True,
+                default=lambda: str(uuid.uuid4()))
+
+    chain_id = Column(String(36), ForeignKey('chains.id'), nullable=False)
+    chain = relationship('Chain', back_populates='snapshots')
+
+    # Path of the archive on the jumpbox, relative to the home directory
+    path = Column(String(255), nullable=False)
+
+    # One of 'creating' or 'available'
+    status = Column(String(30), nullable=False)
+
+    size = Column(BigInteger)
+    block = Column(Integer)
+
+
+class NodeMetrics(BASE, CatenaBase):
+    """Represents the health time series of a node"""
+    __tablename__ = 'node_metrics'
+    __table_args__ = (
+        Index('chain_node_metrics_idx', 'chain_id'),
+        {
+            'mysql_engine': 'InnoDB',
+            'mysql_charset': 'utf8'
+        }
+    )
+
+    node_id = Column(String(36), primary_key=True)
+    chain_id = Column(String(36), nullable=False)
+
+    # See catena.common.timeseries.TimeSeries.to_dict
+    series = Column(Text())
+
+    def get_series(self):
+        if self.series:
+            return json.loads(self.series)
+        else:
+            return {}
+
+    def set_series(self, series):
+        self.series = json.dumps(series)
+
+
+class PooledNode(BASE, CatenaBase):
+    """Represents a pre-booted VM of a cloud's warm pool"""
+    __tablename__ = 'pooled_nodes'
+    __table_args__ = (
+        Index('pool_pooled_node_idx', 'cloud_id', 'flavour', 'network',
+              'jumpbox', 'status'),
+        {
+            'mysql_engine': 'InnoDB',
+            'mysql_charset': 'utf8'
+        }
+    )
+
+    # The id the cloud driver returned for the server
+    id = Column(String(255), primary_key=True)
+
+    cloud_id = Column(String(36), ForeignKey('clouds.id'), nullable=False)
+    flavour = Column(String(255), nullable=False)
+    network = Column(String(255), nullable=False)
+    # The VM was booted with the cloud config of a chain using this jumpbox
+    # (and its security group), so only such chains claim it
+    jumpbox = Column(String(255), nullable=False)
+
+    ssh_key = deferred(Column(Text()), group=BLOBS)
+    ip = Column(String(16))
+
+    # One of 'booting', 'ready' or 'reaping'
+    status = Column(String(30), nullable=False)
 
 
 @enginefacade.writer
 def register_models(context):
     """Create database tables for all models with the given engine."""
-    models = (Chain, ChainNodes, Cloud)
+    models = (Benchmark, Chain, ChainNodes, ChainSnapshot, Cloud, Job,
+              NodeMetrics, PooledNode)
     for model in models:
         model.metadata.create_all(context)
 
@@ -236,6 +498,7 @@ def register_models(context):
 @enginefacade.writer
 def unregister_models(context):
     """Remove database tables for all models with the given engine."""
-    models = (Chain, ChainNodes, Cloud)
+    models = (Benchmark, Chain, ChainNodes, ChainSnapshot, Cloud, Job,
+              NodeMetrics, PooledNode)
     for model in models:
         model.metadata.drop_all(context)
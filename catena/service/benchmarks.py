@@ -0,0 +1,96 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Load tests of deployed chains
+
+A benchmark unlocks the chain's prefunded accounts on the controller for the
+duration of the run and sends transfers between them over JSON-RPC through
+the jumpbox, see catena.chain_backends.ethereum.benchmark.
+"""
+
+from oslo_config import cfg
+from oslo_log import log
+
+from catena.chain_backends.ethereum import benchmark as load
+from catena.chain_backends.ethereum import ethereum_api as chain_api
+from catena.chain_backends.ethereum.rpc import RpcClient
+from catena.common import ssh_utils
+from catena.db.sqlalchemy import api as db_api
+
+CONF = cfg.CONF
+LOG = log.getLogger(__name__)
+
+BENCHMARK_FIELDS = ('id', 'chain_id', 'status', 'rate', 'duration', 'error',
+                    'created_at', 'updated_at')
+
+# Seconds the accounts stay unlocked beyond the benchmark for the ssh tunnel
+_UNLOCK_MARGIN = 60
+
+
+def run_benchmark(benchmark_id):
+    """Runs a benchmark created by db_api.create_benchmark"""
+    context = db_api.get_context()
+    benchmark = db_api.get_benchmark(context, benchmark_id)
+    chain = db_api.get_chain(context, benchmark.chain_id)
+    controller = db_api.get_controller_node(context, chain)
+    cloud_config = chain.get_cloud_config()
+
+    benchmark_accounts = chain_api.get_benchmark_accounts(chain)
+    try:
+        # The accounts only stay unlocked while the benchmark can need them
+        chain_api.unlock_accounts(
+            chain, controller, benchmark_accounts,
+            benchmark.duration + CONF.benchmark.timeout + _UNLOCK_MARGIN)
+
+        with ssh_utils.private_key_files(
+                controller.ssh_key, cloud_config['jumpbox_key']) as key_files:
+            controller_key_file, jumpbox_key_file = key_files
+            with ssh_utils.tunnel(controller.ip, controller_key_file,
+                                  cloud_config['jumpbox_ip'],
+                                  jumpbox_key_file,
+                                  chain_api.RPC_PORT) as port:
+                rpc = RpcClient('http://127.0.0.1:{}'.format(port))
+                result = load.run_load(
+                    rpc, [address for _, address in benchmark_accounts],
+                    benchmark.rate, benchmark.duration,
+                    CONF.benchmark.timeout)
+    except Exception as e:
+        db_api.update_benchmark(context, benchmark.id, {
+            'status': 'failed',
+            'error': str(e)
+        })
+        raise
+    finally:
+        try:
+            chain_api.lock_accounts(chain, controller, benchmark_accounts)
+        except Exception as e:
+            LOG.warning("Could not lock the benchmark accounts of chain "
+                        "{}: {}".format(chain.id, e))
+
+    benchmark.set_result(result)
+    db_api.update_benchmark(context, benchmark.id, {
+        'status': 'succeeded',
+        'result': benchmark.result
+    })
+    LOG.info("Benchmark {} of chain {}: {:.1f} tps".format(
+        benchmark.id, chain.id, result['tps']))
+    return result
+
+
+def cleanup_benchmark(benchmark):
+    data = dict((key, benchmark[key]) for key in BENCHMARK_FIELDS)
+    data['result'] = benchmark.get_result()
+    return data
@@ -0,0 +1,201 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import threading
+import time
+
+import futurist
+from oslo_config import cfg
+from oslo_log import log
+
+from catena.common import utils
+from catena.db.sqlalchemy import api as db_api
+
+CONF = cfg.CONF
+LOG = log.getLogger(__name__)
+
+ACTIONS = {}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# The jobs submitted to this process' executor. The leases of the running
+# ones are renewed by _heartbeat.
+_submitted = set()
+_submitted_lock = threading.Lock()
+
+
+def register(action, fn):
+    ACTIONS[action] = fn
+
+
+def _get_executor():
+    # The executor is created lazily so that every (forked) API worker gets
+    # its own threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = futurist.ThreadPoolExecutor(
+                max_workers=CONF.jobs.workers)
+            heartbeat = threading.Thread(target=_heartbeat,
+                                         name='catena-jobs-heartbeat')
+            heartbeat.daemon = True
+            heartbeat.start()
+    return _executor
+
+
+def _expired_before():
+    return utils.utcnow() - datetime.timedelta(seconds=CONF.jobs.lease)
+
+
+def _heartbeat():
+    """Renews the leases of this process' jobs and takes over expired ones
+
+    A job outlives the process running it only by its lease, e.g. when a
+    worker is replaced on reload and killed after graceful_timeout. Any
+    process with jobs.resume then takes it over, claims are atomic.
+    """
+    while True:
+        time.sleep(CONF.jobs.lease / 4.0)
+        try:
+            with _submitted_lock:
+                submitted = list(_submitted)
+            if submitted:
+                db_api.renew_jobs(db_api.get_context(), submitted,
+                                  utils.utcnow())
+            resume()
+        except Exception:
+            LOG.exception("Renewing the job leases failed")
+
+
+def submit(action, resource_id=None, **kwargs):
+    assert action in ACTIONS, "Unknown job action: {}".format(action)
+
+    context = db_api.get_context()
+    job = db_api.create_job(context, action, kwargs, resource_id)
+
+    _submit(job.id)
+    LOG.debug("Submitted job {} ({})".format(job.id, action))
+    return job
+
+
+def _submit(job_id):
+    executor = _get_executor()
+    with _submitted_lock:
+        if job_id in _submitted:
+            return
+        _submitted.add(job_id)
+    try:
+        executor.submit(_run, job_id)
+    except RuntimeError:
+        # The executor was shut down, another process takes the job over
+        with _submitted_lock:
+            _submitted.discard(job_id)
+
+
+def _run(job_id):
+    context = db_api.get_context()
+
+    try:
+        if not db_api.claim_job(context, job_id, utils.utcnow(),
+                                _expired_before()):
+            LOG.debug("Job {} is already running".format(job_id))
+            return
+
+        _run_claimed(context, job_id)
+    finally:
+        with _submitted_lock:
+            _submitted.discard(job_id)
+
+
+def _run_claimed(context, job_id):
+    job = db_api.get_job(context, job_id)
+    LOG.info("Running job {} ({})".format(job.id, job.action))
+
+    try:
+        result = ACTIONS[job.action](job, **job.get_args())
+    except Exception as e:
+        LOG.exception("Job {} ({}) failed".format(job.id, job.action))
+        db_api.update_job(context, job.id, {
+            'status': 'failed',
+            'error': str(e)
+        })
+    else:
+        values = {'status': 'succeeded'}
+        if result:
+            job.set_result(result)
+            values['result'] = job.result
+            values['resource_id'] = result.get('id', job.resource_id)
+        db_api.update_job(context, job.id, values)
+        LOG.info("Job {} ({}) succeeded".format(job.id, job.action))
+
+
+def set_resource(job, resource_id):
+    """Records the resource a job works on
+
+    Actions call this as soon as their resource has been committed, so that
+    a resumed job continues with it instead of creating a new one.
+    """
+    context = db_api.get_context()
+    db_api.update_job(context, job.id, {'resource_id': resource_id})
+    job.resource_id = resource_id
+
+
+def set_progress(job, progress):
+    context = db_api.get_context()
+    db_api.update_job(context, job.id, {'progress': progress})
+    job.progress = progress
+
+
+def update_args(job, args):
+    """Persists the progress an action made by updating its arguments"""
+    job.set_args(args)
+    context = db_api.get_context()
+    db_api.update_job(context, job.id, {'args': job.args})
+
+
+def resume():
+    """Submits the pending and the expired jobs to this process' executor
+
+    Jobs are claimed atomically, so it is safe for every API worker (on
+    every host) to call this. It is called when a worker starts and then
+    periodically by _heartbeat.
+    """
+    _get_executor()
+    if not CONF.jobs.resume:
+        return
+
+    context = db_api.get_context()
+    for job_id in db_api.get_claimable_job_ids(context, _expired_before()):
+        LOG.debug("Resuming job {}".format(job_id))
+        _submit(job_id)
+
+
+def shutdown():
+    """Waits for the jobs submitted to this process to finish
+
+    Called when a gunicorn worker exits, the master kills it once
+    graceful_timeout passed. The leases are still renewed meanwhile.
+    """
+    with _executor_lock:
+        executor = _executor
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def get_job(job_id):
+    context = db_api.get_context()
+    return db_api.get_job(context, job_id)
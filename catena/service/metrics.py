@@ -0,0 +1,144 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Health metrics of all chain nodes
+
+'catena-manage metrics' polls the status of every node of the active
+chains through geth's console and records it in a time series per node.
+Every jumpbox only relays a bounded number of polls at a time.
+"""
+
+import calendar
+import threading
+
+import futurist
+from oslo_config import cfg
+from oslo_log import log
+
+from catena.chain_backends.ethereum import ethereum_api as chain_api
+from catena.common import ssh_utils
+from catena.common import timeseries
+from catena.common import utils
+from catena.db.sqlalchemy import api as db_api
+
+CONF = cfg.CONF
+LOG = log.getLogger(__name__)
+
+# up is 0 for polls that failed, the other fields are None then
+FIELDS = (('up', min),
+          ('block', max),
+          ('peers', timeseries.mean),
+          ('pending', timeseries.mean),
+          ('syncing', max))
+
+
+def _resolutions():
+    # Every poll of the last hour, 5 minutes for a day and hours for a week
+    return ((0, max(1, 3600 // CONF.metrics.interval)),
+            (300, 288),
+            (3600, 168))
+
+
+def _poll(chain, node):
+    cloud_config = chain.get_cloud_config()
+    with ssh_utils.private_key_files(
+            node.ssh_key, cloud_config['jumpbox_key']) as key_files:
+        node_key_file, jumpbox_key_file = key_files
+        output = ssh_utils.run(node.ip, node_key_file,
+                               cloud_config['jumpbox_ip'], jumpbox_key_file,
+                               chain_api.node_status_command())
+
+    status = chain_api.parse_node_status(output)
+    return {
+        'up': 1,
+        'block': status['block'],
+        'peers': status['peers'],
+        'pending': status['pending'],
+        'syncing': 1 if status['syncing'] else 0
+    }
+
+
+def _record(chain, node, timestamp, sample):
+    context = db_api.get_context()
+    metrics = db_api.get_node_metrics(context, node.id)
+    series = timeseries.TimeSeries.from_dict(
+        FIELDS, _resolutions(), metrics.get_series() if metrics else None)
+    series.add(timestamp, sample)
+    if not db_api.save_node_metrics(context, node.id, chain.id,
+                                    series.to_dict()):
+        LOG.debug("Node {} was deleted while it was polled".format(node.id))
+
+
+def collect():
+    """Polls and records the status of all nodes of the active chains"""
+    context = db_api.get_context()
+    timestamp = calendar.timegm(utils.utcnow().utctimetuple())
+
+    polls = []
+    for chain in db_api.get_chain_models(context, {'status': 'active'},
+                                         load=('nodes',)):
+        polls.extend((chain, node) for node in chain.nodes if node.ip)
+
+    if not polls:
+        return
+
+    limits = {}
+    for chain, _ in polls:
+        jumpbox_ip = chain.get_cloud_config()['jumpbox_ip']
+        limits.setdefault(jumpbox_ip, threading.BoundedSemaphore(
+            CONF.metrics.jumpbox_concurrency))
+
+    def poll(chain, node):
+        with limits[chain.get_cloud_config()['jumpbox_ip']]:
+            try:
+                sample = _poll(chain, node)
+            except Exception as e:
+                LOG.warning("Could not poll node {} of chain {}: {}".format(
+                    node.id, chain.id, e))
+                sample = {'up': 0}
+        _record(chain, node, timestamp, sample)
+
+    with futurist.ThreadPoolExecutor(
+            max_workers=CONF.metrics.workers) as executor:
+        futures = [executor.submit(poll, chain, node)
+                   for chain, node in polls]
+
+    for (chain, node), future in zip(polls, futures):
+        if future.exception() is not None:
+            LOG.error("Could not record the metrics of node {}: {}".format(
+                node.id, future.exception()))
+
+
+def get_node_metrics(chain_id, node_id, step=None):
+    """Returns the recorded series of a node
+
+    Only the resolution with the given step is returned if step is set.
+    """
+    context = db_api.get_context()
+    metrics = db_api.get_node_metrics(context, node_id)
+    if metrics is not None and metrics.chain_id != chain_id:
+        metrics = None
+    series = metrics.get_series() if metrics else {}
+
+    resolutions = [{'step': resolution['step'],
+                    'points': resolution['points']}
+                   for resolution in series.get('resolutions', [])
+                   if step is None or resolution['step'] == step]
+    return {
+        'fields': series.get('fields', [name for name, _ in FIELDS]),
+        'resolutions': resolutions,
+        'updated_at': metrics.updated_at if metrics else None
+    }
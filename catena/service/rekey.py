@@ -0,0 +1,95 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Re-encryption of all stored keys with a new encryption_key
+
+To rotate the key, the new key becomes encryption_key and the old one is
+added to previous_encryption_keys. 'catena-manage rekey' then walks the
+tables in batches and re-encrypts every key that isn't encrypted with the
+new key yet. Each batch is committed on its own, so an interrupted run is
+resumed by running it again. Once it completed, the old key can be
+removed.
+"""
+
+import json
+
+import futurist
+from oslo_config import cfg
+from oslo_log import log
+
+from catena.common import utils
+from catena.db.sqlalchemy import api as db_api
+from catena.db.sqlalchemy import models
+
+CONF = cfg.CONF
+LOG = log.getLogger(__name__)
+
+
+def _reencrypt_cloud_config(cloud_config):
+    config = json.loads(cloud_config)
+    if not config.get('jumpbox_key'):
+        return cloud_config
+    jumpbox_key = utils.reencrypt_key(config['jumpbox_key'])
+    if jumpbox_key == config['jumpbox_key']:
+        return cloud_config
+    config['jumpbox_key'] = jumpbox_key
+    return json.dumps(config)
+
+
+def _reencrypt_key(key):
+    return utils.reencrypt_key(key) if key else key
+
+
+# The columns holding encrypted keys and how to re-encrypt their values
+COLUMNS = ((models.ChainNodes, 'ssh_key', _reencrypt_key),
+           (models.PooledNode, 'ssh_key', _reencrypt_key),
+           (models.Chain, 'cloud_config', _reencrypt_cloud_config))
+
+
+def _rekey_column(executor, model, column, reencrypt, batch_size):
+    context = db_api.get_context()
+    after_id = None
+    total = 0
+
+    while True:
+        rows = db_api.get_column_batch(context, model, column, after_id,
+                                       batch_size)
+        if not rows:
+            break
+        after_id = rows[-1][0]
+
+        values = [value for _, value in rows]
+        updates = [(id, old, new) for (id, old), new in zip(
+            rows, executor.map(reencrypt, values)) if new != old]
+        if updates:
+            total += db_api.update_column_values(context, model, column,
+                                                 updates)
+
+    LOG.info("Re-encrypted {} {} of {}".format(total, column,
+                                               model.__tablename__))
+    return total
+
+
+def rekey(batch_size, workers):
+    """Re-encrypts all stored keys with the current encryption_key"""
+    LOG.info("Re-encrypting keys with key {}".format(
+        utils.key_id(CONF.get('encryption_key'))))
+
+    # Decrypting and encrypting is CPU bound, so it is spread over processes
+    with futurist.ProcessPoolExecutor(max_workers=workers) as executor:
+        return sum(_rekey_column(executor, model, column, reencrypt,
+                                 batch_size)
+                   for model, column, reencrypt in COLUMNS)
@@ -13,47 +13,102 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+import threading
+import uuid
+
+import futurist
 from oslo_config import cfg
 from oslo_db.sqlalchemy import enginefacade
+from oslo_log import log
 
 from catena.chain_backends.ethereum import ethereum_api as chain_api
 from catena.clouds.azure_api import Azure
+from catena.clouds.catalog import CATALOG
 from catena.clouds.openstack_api import OpenStack
-from catena.common.utils import create_and_encrypt_sshkey
+from catena.common.cache import LRUCache
+from catena.common import keypool
+from catena.common import readiness
+from catena.common import ssh_utils
+from catena.common import utils
 from catena.db.sqlalchemy import api as db_api
+from catena.service import benchmarks
+from catena.service import jobs
+from catena.service import metrics
+from catena.service import snapshots
+from catena.service import warm_pool
 
 CONF = cfg.CONF
+LOG = log.getLogger(__name__)
 
 CLOUDS = {'openstack': OpenStack, 'azure': Azure}
 
+# These are white-lists because we have secrets (like ssh keys) in the db
+#  that shouldn't be exposed. List queries only load these columns.
+CLOUD_FIELDS = ('cloud_config', 'id', 'name', 'created_at', 'updated_at')
+NODE_FIELDS = ('chain_config', 'ip', 'id', 'name', 'type', 'flavour',
+               'status', 'chain_id', 'created_at', 'updated_at')
+CHAIN_FIELDS = ('chain_backend', 'chain_config', 'id', 'cloud_id', 'name',
+                'status', 'created_at', 'updated_at')
+
+# The provisioning steps of a node in order, node.status is the last one
+# committed. Nodes claimed from the warm pool start at 'ip_assigned'.
+NODE_STEPS = ('cloud_created', 'ip_assigned', 'provisioned', 'registered')
+
 
 def get_cloud_types():
     return CLOUDS.keys()
 
 
-def get_clouds():
+def get_clouds(filters=None, marker=None, limit=None, sort_key=None,
+               sort_dir=None):
     context = db_api.get_context()
-    clouds = db_api.get_clouds(context)
+    clouds = db_api.get_clouds(context, filters, marker, limit, sort_key,
+                               sort_dir, columns=CLOUD_FIELDS)
     result = [_cleanup_cloud(cloud) for cloud in clouds]
 
     return result
 
 
 def _cleanup_cloud(cloud):
-    # This is a white-list because we have secrets (like ssh keys) in the db
-    #  that shouldn't be exposed
+    return dict((key, cloud[key]) for key in CLOUD_FIELDS)
 
-    return {
-        'cloud_config': cloud['cloud_config'],
-        'id': cloud['id'],
-        'name': cloud['name'],
-        'created_at': cloud['created_at'],
-        'updated_at': cloud['updated_at'],
-    }
+
+_cloud_apis = None
+_cloud_apis_lock = threading.Lock()
+
+
+def _get_cloud_api_cache():
+    global _cloud_apis
+    with _cloud_apis_lock:
+        if _cloud_apis is None:
+            _cloud_apis = LRUCache(CONF.clouds.client_cache_size,
+                                   CONF.clouds.client_cache_ttl)
+    return _cloud_apis
+
+
+def _cloud_digest(cloud):
+    digest = hashlib.sha256(cloud.authentication.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update((cloud.cloud_config or '').encode('utf-8'))
+    return digest.hexdigest()
 
 
 def get_cloud_api_by_model(cloud):
-    return CLOUDS[cloud.type](cloud)
+    # Cloud API clients are expensive to create (new tokens, new connection
+    # pools), so they are shared per process. They never change once created:
+    # the key includes a hash of the credentials and the cloud config, so
+    # changed credentials or e.g. a new golden image result in a new client.
+    cache = _get_cloud_api_cache()
+    key = (cloud.id, _cloud_digest(cloud))
+
+    cloud_api = cache.get(key)
+    if cloud_api is None:
+        cache.discard(lambda cached_key: cached_key[0] == cloud.id)
+        cloud_api = CLOUDS[cloud.type](cloud)
+        cache.set(key, cloud_api)
+
+    return cloud_api
 
 
 def get_cloud_api(cloud_id):
@@ -75,50 +130,338 @@ def create_cloud(type, name, authentication, config):
     return cloud
 
 
+def _validate_node_data(data):
+    # Checked before the job is submitted, so that the request fails instead
+    # of the job
+    assert isinstance(data, dict), "Nodes must be objects"
+    for key in ('name', 'flavour', 'type'):
+        assert data.get(key), "Must specify a {}".format(key)
+    chain_api.validate_geth_overrides(data.get('geth'))
+
+
 def create_node(blockchain_id, data):
+    _validate_node_data(data)
+
+    job = jobs.submit('create_node', blockchain_id=blockchain_id, data=data)
+    return _cleanup_job_data(job)
+
+
+def create_nodes(blockchain_id, nodes):
+    assert isinstance(nodes, list) and nodes, "Must specify nodes"
+    for data in nodes:
+        _validate_node_data(data)
+
+    job = jobs.submit('create_nodes', resource_id=blockchain_id,
+                      blockchain_id=blockchain_id, nodes=nodes)
+    return _cleanup_job_data(job)
+
+
+def _create_node(job, blockchain_id, data):
     context = db_api.get_context()
+    chain = db_api.get_chain(context, blockchain_id,
+                             load=('cloud', 'nodes'))
+    if chain is None:
+        raise Exception('Chain {} does not exist'.format(blockchain_id))
 
-    with enginefacade.writer.using(context):
-        blockchain = db_api.get_chain(context, blockchain_id)
-        controller_node = db_api.get_controller_node(context, blockchain)
-        cloud_api = get_cloud_api_by_model(blockchain.cloud)
+    if job.resource_id:
+        node = _find_node(chain, job.resource_id)
+    else:
+        node = _create_cloud_node(context, chain, data['flavour'],
+                                  data['name'], data['type'],
+                                  data.get('geth'))
+        jobs.set_resource(job, node.id)
+
+    _resume_node(context, chain, node)
+
+    return {'id': node.id}
+
+
+def _create_nodes(job, blockchain_id, nodes):
+    # The VMs are created and booted concurrently, then all of them are
+    # provisioned with a single ansible run
+    context = db_api.get_context()
+    chain = db_api.get_chain(context, blockchain_id,
+                             load=('cloud', 'nodes'))
+    if chain is None:
+        raise Exception('Chain {} does not exist'.format(blockchain_id))
+    args_lock = threading.Lock()
+
+    def boot(data):
+        # Transaction contexts can't be shared between threads
+        context = db_api.get_context()
+
+        # Nodes are loaded per thread, so that no instance (nor the chain
+        # they reference) is shared between sessions
+        node = None
+        if data.get('id'):
+            node = db_api.get_node(context, chain, data['id'])
+        if node is None:
+            node = _create_cloud_node(context, chain, data['flavour'],
+                                      data['name'], data['type'],
+                                      data.get('geth'))
+            # Remember the node, so that a resumed job doesn't create it again
+            with args_lock:
+                data['id'] = node.id
+                jobs.update_args(job, {'blockchain_id': blockchain_id,
+                                       'nodes': nodes})
+
+        _boot_node(context, chain, node)
+        return node
 
-        public_key, encrypted_key = create_and_encrypt_sshkey()
-
-        id, ip = cloud_api.add_node(public_key, data['flavour'], data['name'],
-                                    blockchain)
-        node = db_api.create_node(context, id, blockchain, ip, encrypted_key,
-                                  data['type'], data['name'])
-        node_id = chain_api.provision_node(blockchain, node,
-                                           blockchain.get_cloud_config()[
-                                               'jumpbox_ip'],
-                                           controller_node.ip)
-        chain_config = {'eth_node_id': node_id.split('"')[1]}
-        node.set_chain_config(chain_config)
+    workers = max(1, min(len(nodes), CONF.jobs.boot_workers))
+    with futurist.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(boot, data) for data in nodes]
+
+    booted = []
+    errors = []
+    for data, future in zip(nodes, futures):
+        try:
+            booted.append(future.result())
+        except Exception as e:
+            LOG.error("Creating node {} failed: {}".format(data['name'], e))
+            errors.append('{}: {}'.format(data['name'], e))
+
+    _provision_nodes(context, chain, booted)
+    for node in booted:
+        _register_node(context, chain, node)
+
+    if errors:
+        raise Exception('{} of {} nodes failed. {}'.format(
+            len(errors), len(nodes), '; '.join(errors)))
+
+    return {'id': chain.id, 'node_ids': [node.id for node in booted]}
+
+
+def _find_node(chain, node_id):
+    for node in chain.nodes:
+        if node.id == node_id:
+            return node
+
+
+def _find_controller(chain):
+    for node in chain.nodes:
+        if node.type == 'controller':
+            return node
+
+
+def _create_cloud_node(context, chain, flavour, name, type, geth=None):
+    cloud_api = get_cloud_api_by_model(chain.cloud)
+
+    public_key, encrypted_key = keypool.get_keypair()
+    # The overrides of the flavour's geth settings, see
+    # chain_api.geth_tuning
+    chain_config = {'geth': geth} if geth else None
+
+    if CONF.warm_pool.enabled:
+        node = warm_pool.claim(context, chain, flavour, name, type,
+                               public_key, encrypted_key, chain_config)
+        if node is not None:
+            return node
+
+    id = cloud_api.create_server(public_key, flavour, name, chain)
+
+    return db_api.create_node(context, id=id, chain=chain, ip=None,
+                              ssh_key=encrypted_key, name=name, type=type,
+                              status='cloud_created', flavour=flavour,
+                              chain_config=chain_config)
+
+
+# Every step runs outside of a transaction and is committed on its own, so a
+# resumed job continues with the step after node.status
+
+def _resume_node(context, chain, node):
+    _boot_node(context, chain, node)
+
+    if node.type == 'controller':
+        _provision_controller(context, chain, node)
+    else:
+        _provision_nodes(context, chain, [node])
+
+    _register_node(context, chain, node)
+
+
+def _boot_node(context, chain, node):
+    if node.status == 'cloud_created':
+        cloud_api = get_cloud_api_by_model(chain.cloud)
+        node.ip = cloud_api.wait_for_ip(chain, node.id)
+        _commit_step(context, chain, node, 'ip_assigned')
+
+    if node.status == 'ip_assigned':
+        _wait_until_ready(chain, node)
+
+
+def _provision_controller(context, chain, node):
+    if node.status == 'ip_assigned':
+        jumpbox_ip = chain.get_cloud_config()['jumpbox_ip']
+
+        # The genesis of a proof-of-authority chain names the controller as
+        # its signer, so its account is created before the genesis is used
+        if chain_api.needs_initial_signer(chain):
+            signer = chain_api.create_signer(chain, node, jumpbox_ip)
+            chain_api.set_initial_signers(chain, [signer])
+            chain.save(context)
+
+        result = chain_api.provision_controller(
+            chain, node, jumpbox_ip, _get_flavour_details(chain))
+        _set_node_result(node, result)
+        _commit_step(context, chain, node, 'provisioned')
+
+
+def _provision_nodes(context, chain, nodes):
+    nodes = [node for node in nodes if node.status == 'ip_assigned']
+    if not nodes:
+        return
+
+    if CONF.snapshots.enabled:
+        snapshots.seed_nodes(context, chain, nodes)
+
+    jumpbox_ip = chain.get_cloud_config()['jumpbox_ip']
+    controller_node = _find_controller(chain)
+    _backfill_enodes(context, chain)
+    enodes = db_api.get_enodes(context, chain.id)
+    results = chain_api.provision_nodes(chain, nodes, jumpbox_ip,
+                                        controller_node.ip, enodes,
+                                        _get_flavour_details(chain))
+    for node in nodes:
+        _set_node_result(node, results[node.id])
+
+    if chain_api.uses_signers(chain):
+        _propose_signers(chain, nodes)
+
+    for node in nodes:
+        _commit_step(context, chain, node, 'provisioned')
+
+
+def _backfill_enodes(context, chain):
+    # Nodes provisioned before the enode column existed only have their
+    # ethereum node id in their chain config
+    for node in chain.nodes:
+        eth_node_id = node.get_chain_config().get('eth_node_id')
+        if node.enode is None and node.ip and eth_node_id:
+            node.enode = chain_api.enode_url(eth_node_id, node.ip)
+            node.save(context)
+
+
+def _get_flavour_details(chain):
+    # Nodes of unknown flavours run with geth's defaults, so a failing
+    # lookup doesn't fail the provisioning
+    try:
+        return CATALOG.get(
+            chain.cloud_id, 'flavour_details',
+            lambda: get_cloud_api_by_model(chain.cloud).get_flavour_details(),
+            _cloud_digest(chain.cloud))
+    except Exception as e:
+        LOG.warning("Could not get the flavours of cloud {}: {}".format(
+            chain.cloud_id, e))
+        return {}
+
+
+def _set_node_result(node, result):
+    eth_node_id = result['eth_node_id'].split('"')[1]
+    chain_config = node.get_chain_config()
+    chain_config['eth_node_id'] = eth_node_id
+    if result.get('signer'):
+        chain_config['signer'] = result['signer']
+    node.set_chain_config(chain_config)
+    node.enode = chain_api.enode_url(eth_node_id, node.ip)
+
+
+def _get_signer_nodes(chain):
+    return [node for node in chain.nodes if node.status == 'registered' and
+            node.get_chain_config().get('signer')]
+
+
+def _propose_signers(chain, nodes):
+    # The new nodes vote as well, so that the remaining votes are cast as
+    # soon as the first of them became signers
+    signers = [node.get_chain_config()['signer'] for node in nodes]
+    voters = _get_signer_nodes(chain) + nodes
+    failed = chain_api.propose_signers(chain, voters, signers, True)
+    if failed:
+        # The nodes aren't committed as provisioned yet, so a resumed job
+        # votes again
+        raise Exception('Nodes {} could not vote on the new signers'.format(
+            ", ".join(voter.id for voter in failed)))
+
+
+def _register_node(context, chain, node):
+    if node.status == 'provisioned':
+        _commit_step(context, chain, node, 'registered')
+
+
+def _wait_until_ready(chain, node):
+    cloud_config = chain.get_cloud_config()
+
+    with ssh_utils.private_key_files(
+            node.ssh_key, cloud_config['jumpbox_key']) as key_files:
+        node_key_file, jumpbox_key_file = key_files
+        readiness.wait_for_ssh(node.ip, node_key_file,
+                               cloud_config['jumpbox_ip'], jumpbox_key_file)
+
+
+def _commit_step(context, chain, node, step):
+    LOG.debug("Node {} of chain {}: {}".format(node.id, chain.id, step))
+
+    node.status = step
+    if node.type != 'controller':
         node.save(context)
+        return
 
-    return node
+    # The chain is usable as soon as its controller is
+    chain.status = 'active' if step == 'registered' else step
+    with enginefacade.writer.using(context):
+        node.save(context)
+        chain.save(context)
 
 
 def delete_node(blockchain_id, node_id):
+    job = jobs.submit('delete_node', resource_id=node_id,
+                      blockchain_id=blockchain_id, node_id=node_id)
+    return _cleanup_job_data(job)
+
+
+def _remove_signer(context, blockchain_id, node, signer):
+    # A removed signer that keeps counting towards the majority could stall
+    # the chain, so the VM is only deleted once the removal passed. The
+    # outgoing signer votes as well, with two signers the remaining vote
+    # alone is no majority.
+    blockchain = db_api.get_chain(context, blockchain_id,
+                                  load=('cloud', 'nodes'))
+    if blockchain is None:
+        raise Exception('Chain {} does not exist'.format(blockchain_id))
+    voters = _get_signer_nodes(blockchain)
+    failed = chain_api.propose_signers(blockchain, voters, [signer], False)
+    if failed:
+        raise Exception('Nodes {} could not vote on removing signer '
+                        '{}'.format(", ".join(voter.id for voter in failed),
+                                    signer))
+
+    controller = _find_controller(blockchain)
+    chain_api.wait_for_signers(blockchain, controller, [signer], False)
+
+
+def _delete_node(job, blockchain_id, node_id):
     context = db_api.get_context()
 
-    with enginefacade.writer.using(context):
-        blockchain = db_api.get_chain(context, blockchain_id)
-        node = db_api.get_node(context, blockchain, node_id)
-        if node.type != 'controller':
-            cloud_api = get_cloud_api(blockchain.cloud_id)
-            cloud_api.delete_node(blockchain, node.id)
-            node.delete(context)
+    blockchain = db_api.get_chain(context, blockchain_id, load=('cloud',))
+    node = db_api.get_node(context, blockchain, node_id)
+    if node.type != 'controller':
+        signer = node.get_chain_config().get('signer')
+        if signer and chain_api.uses_signers(blockchain):
+            _remove_signer(context, blockchain_id, node, signer)
+
+        cloud_api = get_cloud_api_by_model(blockchain.cloud)
+        cloud_api.delete_node(blockchain, node.id)
+        db_api.delete_node(context, node.id)
 
 
 def get_nodes(blockchain_id):
     context = db_api.get_context()
 
     with enginefacade.reader.using(context):
-        blockchain = db_api.get_chain(context, blockchain_id)
+        nodes = db_api.get_nodes(context, blockchain_id, columns=NODE_FIELDS)
 
-        result = [_cleanup_node_data(node) for node in blockchain.nodes]
+        result = [_cleanup_node_data(node) for node in nodes]
 
         return result
 
@@ -133,20 +476,12 @@ def get_node(blockchain_id, node_id):
         return _cleanup_node_data(node)
 
 
-def _cleanup_node_data(node):
-    # This is a white-list because we have secrets (like ssh keys) in the db
-    #  that shouldn't be exposed
+def get_node_metrics(blockchain_id, node_id, step=None):
+    return metrics.get_node_metrics(blockchain_id, node_id, step)
 
-    return {
-        'chain_config': node['chain_config'],
-        'ip': node['ip'],
-        'id': node['id'],
-        'name': node['name'],
-        'type': node['type'],
-        'chain_id': node['chain_id'],
-        'created_at': node['created_at'],
-        'updated_at': node['updated_at'],
-    }
+
+def _cleanup_node_data(node):
+    return dict((key, node[key]) for key in NODE_FIELDS)
 
 
 def get_backend_info():
@@ -156,47 +491,51 @@ def get_backend_info():
 def create_chain(cloud_id, name, new_chain_config, new_cloud_config):
     assert len(name) > 0, "Must specify a name"
 
-    context = db_api.get_context()
+    job = jobs.submit('create_chain', cloud_id=cloud_id, name=name,
+                      new_chain_config=new_chain_config,
+                      new_cloud_config=new_cloud_config)
+    return _cleanup_job_data(job)
 
-    with enginefacade.writer.using(context):
-        cloud = db_api.get_cloud(context, cloud_id)
 
-        cloud_api = get_cloud_api_by_model(cloud)
+def _create_chain(job, cloud_id, name, new_chain_config,
+                  new_cloud_config):
+    context = db_api.get_context()
 
+    if not job.resource_id:
+        cloud = db_api.get_cloud(context, cloud_id)
         chain = db_api.create_chain(context, name, "ethereum", cloud,
                                     new_chain_config, new_cloud_config)
+        jobs.set_resource(job, chain.id)
+
+    chain = db_api.get_chain(context, job.resource_id,
+                             load=('cloud', 'nodes'))
+    if chain is None:
+        raise Exception('Chain {} does not exist'.format(job.resource_id))
+
+    if chain.status == 'creating':
+        cloud_api = get_cloud_api_by_model(chain.cloud)
         chain_api.initialize_chain(chain)
         cloud_api.initialize_cloud(chain)
+        chain.status = 'initialized'
         chain.save(context)
 
+    node = _find_controller(chain)
+    if node is None:
         cloud_config = chain.get_cloud_config()
-        chain_config = chain.get_chain_config()
-
-        controller_name = chain.name + "_controller"
-
-        public_key, encrypted_key = create_and_encrypt_sshkey()
-
-        id, ip = cloud_api.add_node(public_key,
-                                    cloud_config['controller_flavour'],
-                                    controller_name, chain)
+        node = _create_cloud_node(context, chain,
+                                  cloud_config['controller_flavour'],
+                                  chain.name + '_controller', 'controller')
 
-        node = db_api.create_node(context, id=id, chain=chain, ip=ip,
-                                  ssh_key=encrypted_key,
-                                  name=chain.name + '_controller',
-                                  type='controller')
+    _resume_node(context, chain, node)
 
-        node_id = chain_api.provision_controller(chain, node,
-                                                 cloud_config['jumpbox_ip'])
-        chain_config = {'eth_node_id': node_id.split('"')[1]}
-        node.set_chain_config(chain_config)
-        node.save(context)
-
-    return chain
+    return {'id': chain.id}
 
 
-def get_chains():
+def get_chains(filters=None, marker=None, limit=None, sort_key=None,
+               sort_dir=None):
     context = db_api.get_context()
-    chains = db_api.get_chains(context)
+    chains = db_api.get_chains(context, filters, marker, limit, sort_key,
+                               sort_dir, columns=CHAIN_FIELDS)
 
     result = [_cleanup_chain_data(chain) for chain in chains]
 
@@ -211,39 +550,234 @@ def get_chain(chain_id):
 
 
 def _cleanup_chain_data(chain):
-    # This is a white-list because we have secrets (like ssh keys) in the db
-    #  that shouldn't be exposed
-
-    return {
-        'chain_backend': chain['chain_backend'],
-        'chain_config': chain['chain_config'],
-        'id': chain['id'],
-        'cloud_id': chain['cloud_id'],
-        'name': chain['name'],
-        'created_at': chain['created_at'],
-        'updated_at': chain['updated_at'],
-    }
+    return dict((key, chain[key]) for key in CHAIN_FIELDS)
 
 
 def delete_chain(chain_id):
+    job = jobs.submit('delete_chain', resource_id=chain_id, chain_id=chain_id)
+    return _cleanup_job_data(job)
+
+
+def _delete_chain(job, chain_id):
+    # Nodes are deleted concurrently and every node row is only removed once
+    # the cloud confirmed the deletion of its VM
     context = db_api.get_context()
 
-    with enginefacade.writer.using(context):
-        chain = db_api.get_chain(context, chain_id)
-        nodes = db_api.get_nodes(context, chain)
-        cloud_api = get_cloud_api(chain.cloud_id)
-        for node in nodes:
-            cloud_api.delete_node(chain, node['id'])
-        chain.delete(context)
+    chain = db_api.get_chain(context, chain_id, load=('cloud',))
+    chain.status = 'deleting'
+    chain.save(context)
+
+    # Only the ids are loaded, the node rows are deleted in other sessions
+    nodes = db_api.get_nodes(context, chain.id, columns=('id',))
+    cloud_api = get_cloud_api_by_model(chain.cloud)
+    progress_lock = threading.Lock()
+    deleted = []
+
+    def delete(node_id):
+        cloud_api.delete_node(chain, node_id)
+        db_api.delete_node(db_api.get_context(), node_id)
+
+        with progress_lock:
+            deleted.append(node_id)
+            jobs.set_progress(job, '{} of {} nodes deleted'.format(
+                len(deleted), len(nodes)))
+
+    workers = max(1, min(len(nodes), CONF.jobs.teardown_workers))
+    with futurist.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(delete, node['id']) for node in nodes]
+
+    errors = []
+    for node, future in zip(nodes, futures):
+        try:
+            future.result()
+        except Exception as e:
+            LOG.error("Deleting node {} failed: {}".format(node['id'], e))
+            errors.append('{}: {}'.format(node['id'], e))
+
+    if errors:
+        chain.status = 'delete_failed'
+        chain.save(context)
+        raise Exception('{} of {} nodes could not be deleted. {}'.format(
+            len(errors), len(nodes), '; '.join(errors)))
+
+    try:
+        snapshots.delete_snapshots(chain)
+    except Exception as e:
+        LOG.warning("Could not delete the snapshots of chain {}: {}".format(
+            chain.id, e))
+
+    chain.delete(context)
+
+
+def refill_warm_pools():
+    """Refills and reaps the warm pools of all clouds that have active chains
+
+    The pools follow the networks and jumpboxes the active chains use. Pool
+    VMs are booted with the cloud config of one of these chains. With
+    warm_pool.enabled unset the pools are only reaped.
+    """
+    context = db_api.get_context()
+
+    pools = {}
+    for chain in db_api.get_chain_models(context, {'status': 'active'},
+                                         load=('cloud',)):
+        cloud_config = chain.get_cloud_config()
+        key = (chain.cloud_id, cloud_config['network'],
+               cloud_config['jumpbox'])
+        pools.setdefault(key, chain)
+
+    for chain in pools.values():
+        cloud_api = get_cloud_api_by_model(chain.cloud)
+        warm_pool.reap(cloud_api, chain)
+        if not CONF.warm_pool.enabled:
+            continue
+        for flavour in CONF.warm_pool.flavours:
+            warm_pool.refill(cloud_api, chain, flavour)
+
+
+def build_image(chain_id, flavour, name=None):
+    """Builds a golden image and makes it the image of the chain's cloud
+
+    A builder VM is booted into the chain's network, provisioned with all
+    packages, snapshotted and deleted. Nodes booted from the golden image
+    skip the package installation.
+    """
+    context = db_api.get_context()
+    chain = db_api.get_chain(context, chain_id, load=('cloud',))
+    cloud = chain.cloud
+    cloud_api = get_cloud_api_by_model(cloud)
+    cloud_config = chain.get_cloud_config()
+
+    if name is None:
+        name = 'catena-{}'.format(utils.utcnow().strftime('%Y%m%d%H%M%S'))
+
+    public_key, encrypted_key = keypool.get_keypair()
+    id = cloud_api.create_server(
+        public_key, flavour, 'catena-builder-{}'.format(uuid.uuid4().hex[:8]),
+        chain)
+
+    try:
+        ip = cloud_api.wait_for_ip(chain, id)
+
+        with ssh_utils.private_key_files(
+                encrypted_key, cloud_config['jumpbox_key']) as key_files:
+            node_key_file, jumpbox_key_file = key_files
+            readiness.wait_for_ssh(ip, node_key_file,
+                                   cloud_config['jumpbox_ip'],
+                                   jumpbox_key_file)
+
+        chain_api.build_image(cloud.get_cloud_config(), ip, encrypted_key,
+                              cloud_config['jumpbox_ip'],
+                              cloud_config['jumpbox_key'],
+                              deprovision_agent=cloud.type == 'azure')
+
+        LOG.info("Creating image {}".format(name))
+        image_config = cloud_api.create_image(chain, id, name)
+    finally:
+        cloud_api.delete_node(chain, id)
+
+    provider_config = cloud.get_cloud_config()
+    provider_config.update(image_config)
+    provider_config['golden_image'] = True
+    cloud.set_cloud_config(provider_config)
+    cloud.save(context)
+
+    return image_config
+
+
+def create_benchmark(chain_id, data):
+    rate = float(data.get('rate', CONF.benchmark.rate))
+    duration = int(data.get('duration', CONF.benchmark.duration))
+    assert rate > 0, "Rate must be positive"
+    assert duration > 0, "Duration must be positive"
+
+    context = db_api.get_context()
+    chain = db_api.get_chain(context, chain_id)
+    assert chain.status == 'active', "Chain {} is not active".format(
+        chain_id)
+
+    job = jobs.submit('benchmark', chain_id=chain_id, rate=rate,
+                      duration=duration)
+    return _cleanup_job_data(job)
+
+
+def _benchmark(job, chain_id, rate, duration):
+    if not job.resource_id:
+        context = db_api.get_context()
+        benchmark = db_api.create_benchmark(context, chain_id, rate,
+                                            duration)
+        jobs.set_resource(job, benchmark.id)
+
+    result = benchmarks.run_benchmark(job.resource_id)
+    result['id'] = job.resource_id
+    return result
+
+
+def run_benchmark(chain_id, rate=None, duration=None):
+    """Runs a benchmark in this process and returns its result"""
+    context = db_api.get_context()
+    benchmark = db_api.create_benchmark(
+        context, chain_id, rate or CONF.benchmark.rate,
+        duration or CONF.benchmark.duration)
+    return benchmarks.run_benchmark(benchmark.id)
+
+
+def get_benchmarks(chain_id):
+    context = db_api.get_context()
+    return [benchmarks.cleanup_benchmark(benchmark)
+            for benchmark in db_api.get_benchmarks(context, chain_id)]
+
+
+def _get_catalog(cloud_id, kind, list_fn):
+    # The listings are cached with the version of the cloud's credentials,
+    # so changed credentials aren't answered from the cache
+    context = db_api.get_context()
+    cloud = db_api.get_cloud(context, cloud_id)
+    return CATALOG.get(cloud_id, kind,
+                       lambda: list_fn(get_cloud_api_by_model(cloud)),
+                       _cloud_digest(cloud))
 
 
 def get_node_flavours(cloud_id):
-    return get_cloud_api(cloud_id).get_node_flavours()
+    return _get_catalog(cloud_id, 'flavours',
+                        lambda cloud_api: cloud_api.get_node_flavours())
 
 
 def get_networks(cloud_id):
-    return get_cloud_api(cloud_id).get_networks()
+    return _get_catalog(cloud_id, 'networks',
+                        lambda cloud_api: cloud_api.get_networks())
 
 
 def get_instances(cloud_id):
-    return get_cloud_api(cloud_id).get_instances()
+    return _get_catalog(cloud_id, 'instances',
+                        lambda cloud_api: cloud_api.get_instances())
+
+
+def get_job(job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        return None
+
+    return _cleanup_job_data(job)
+
+
+def _cleanup_job_data(job):
+    return {
+        'job_id': job.id,
+        'action': job.action,
+        'status': job.status,
+        'progress': job.progress,
+        'resource_id': job.resource_id,
+        'result': job.get_result(),
+        'error': job.error,
+        'created_at': job.created_at,
+        'updated_at': job.updated_at,
+    }
+
+
+jobs.register('create_chain', _create_chain)
+jobs.register('create_node', _create_node)
+jobs.register('create_nodes', _create_nodes)
+jobs.register('delete_node', _delete_node)
+jobs.register('delete_chain', _delete_chain)
+jobs.register('benchmark', _benchmark)
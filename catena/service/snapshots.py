@@ -0,0 +1,239 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Chaindata snapshots of long-running chains
+
+Snapshots are archives of a node's chaindata, stored on the chain's jumpbox
+by 'catena-manage snapshot'. geth is stopped on the node while its chaindata
+is archived, so the controller (the bootnode and stats host) is never used.
+New nodes are seeded with the latest snapshot before geth starts, so they
+only sync the blocks since then.
+"""
+
+import datetime
+
+import futurist
+from oslo_config import cfg
+from oslo_log import log
+
+from catena.chain_backends.ethereum import ethereum_api as chain_api
+from catena.common import ssh_utils
+from catena.common import utils
+from catena.db.sqlalchemy import api as db_api
+
+CONF = cfg.CONF
+LOG = log.getLogger(__name__)
+
+
+def _snapshot_dir(chain_id):
+    return '{}/{}'.format(CONF.snapshots.jumpbox_dir, chain_id)
+
+
+def _pick_source(chain):
+    """Returns the node to snapshot, or None if no node can be stopped
+
+    Nodes that don't seal are preferred. A clique chain only keeps sealing
+    while more than half of its signers are online, so a signer is only
+    stopped if at least three are registered.
+    """
+    registered = [node for node in chain.nodes if node.status == 'registered']
+    signers = [node for node in registered
+               if node.get_chain_config().get('signer')]
+    candidates = sorted(
+        (node for node in registered if node.type != 'controller'),
+        key=lambda node: bool(node.get_chain_config().get('signer')))
+
+    for node in candidates:
+        if not node.get_chain_config().get('signer') or len(signers) >= 3:
+            return node
+    return None
+
+
+def create_snapshot(chain_id):
+    """Streams the chaindata of a node into an archive on the jumpbox"""
+    context = db_api.get_context()
+    chain = db_api.get_chain(context, chain_id, load=('nodes',))
+    source_node = _pick_source(chain)
+    if source_node is None:
+        LOG.info("Chain {} has no node that can be stopped for a "
+                 "snapshot".format(chain.id))
+        return
+
+    cloud_config = chain.get_cloud_config()
+    jumpbox_ip = cloud_config['jumpbox_ip']
+
+    path = '{}/{}.tar.gz'.format(_snapshot_dir(chain.id),
+                                 utils.utcnow().strftime('%Y%m%d%H%M%S'))
+    snapshot = db_api.create_snapshot(context, chain.id, path)
+    LOG.info("Creating snapshot {} of chain {} from node {}".format(
+        path, chain.id, source_node.id))
+
+    with ssh_utils.private_key_files(
+            source_node.ssh_key, cloud_config['jumpbox_key']) as key_files:
+        source_key_file, jumpbox_key_file = key_files
+
+        try:
+            block = ssh_utils.run(source_node.ip, source_key_file,
+                                  jumpbox_ip, jumpbox_key_file,
+                                  chain_api.block_number_command())
+
+            source = ssh_utils.ssh_command(
+                source_node.ip, source_key_file, jumpbox_ip,
+                jumpbox_key_file, ['BatchMode=yes',
+                                   'UserKnownHostsFile=/dev/null'])
+            source.append(chain_api.snapshot_export_command())
+
+            # The archive only gets its final name once it is complete
+            sink = ssh_utils.jumpbox_command(jumpbox_ip, jumpbox_key_file)
+            sink.append('mkdir -p {0} && cat > {1}.part && '
+                        'mv {1}.part {1} && stat -c %s {1}'.format(
+                            _snapshot_dir(chain.id), path))
+
+            size = ssh_utils.pipe(source, sink)
+        except Exception:
+            db_api.delete_snapshot(context, snapshot.id)
+            try:
+                ssh_utils.run_on_jumpbox(jumpbox_ip, jumpbox_key_file,
+                                         'rm -f {}.part'.format(path))
+            except Exception:
+                LOG.warning("Could not remove {}.part".format(path))
+            raise
+
+        db_api.update_snapshot(context, snapshot.id, {
+            'status': 'available',
+            'size': int(size),
+            'block': int(block)
+        })
+        LOG.info("Snapshot {} of chain {} is available ({} bytes, block "
+                 "{})".format(path, chain.id, int(size), int(block)))
+
+        _prune(context, chain, jumpbox_ip, jumpbox_key_file)
+
+
+def _prune(context, chain, jumpbox_ip, jumpbox_key_file):
+    for snapshot in db_api.get_snapshots(context, chain.id)[
+            CONF.snapshots.keep:]:
+        LOG.debug("Deleting snapshot {}".format(snapshot.path))
+        ssh_utils.run_on_jumpbox(jumpbox_ip, jumpbox_key_file,
+                                 'rm -f {}'.format(snapshot.path))
+        db_api.delete_snapshot(context, snapshot.id)
+
+
+def _remove_stale_snapshots(context):
+    # Snapshots left 'creating' by a crashed run are never completed
+    before = utils.utcnow() - datetime.timedelta(
+        seconds=CONF.snapshots.timeout)
+    for snapshot in db_api.get_stale_snapshots(context, before):
+        LOG.info("Removing stale snapshot {}".format(snapshot.path))
+        chain = db_api.get_chain(context, snapshot.chain_id)
+        cloud_config = chain.get_cloud_config()
+        try:
+            with ssh_utils.private_key_files(
+                    cloud_config['jumpbox_key']) as key_files:
+                ssh_utils.run_on_jumpbox(cloud_config['jumpbox_ip'],
+                                         key_files[0],
+                                         'rm -f {}.part'.format(
+                                             snapshot.path))
+        except Exception as e:
+            LOG.warning("Could not remove {}.part: {}".format(
+                snapshot.path, e))
+            continue
+        db_api.delete_snapshot(context, snapshot.id)
+
+
+def create_due_snapshots():
+    """Snapshots every active chain whose latest snapshot is too old"""
+    context = db_api.get_context()
+    _remove_stale_snapshots(context)
+
+    due = utils.utcnow() - datetime.timedelta(
+        seconds=CONF.snapshots.interval)
+
+    latest = db_api.get_latest_snapshot_dates(context)
+    chain_ids = []
+    for chain in db_api.get_chains(context, filters={'status': 'active'},
+                                   columns=('id',)):
+        created_at = latest.get(chain['id'])
+        if created_at is None or created_at < due:
+            chain_ids.append(chain['id'])
+
+    if not chain_ids:
+        return
+
+    with futurist.ThreadPoolExecutor(
+            max_workers=CONF.snapshots.workers) as executor:
+        futures = [executor.submit(create_snapshot, chain_id)
+                   for chain_id in chain_ids]
+
+    for chain_id, future in zip(chain_ids, futures):
+        if future.exception() is not None:
+            LOG.error("Could not snapshot chain {}: {}".format(
+                chain_id, future.exception()))
+
+
+def seed_nodes(context, chain, nodes):
+    """Extracts the latest snapshot of the chain on the nodes
+
+    Nodes that can't be seeded sync the whole chain instead.
+    """
+    snapshot = db_api.get_latest_snapshot(context, chain.id)
+    if snapshot is None:
+        return
+
+    cloud_config = chain.get_cloud_config()
+    jumpbox_ip = cloud_config['jumpbox_ip']
+
+    def seed(node):
+        with ssh_utils.private_key_files(
+                node.ssh_key, cloud_config['jumpbox_key']) as key_files:
+            node_key_file, jumpbox_key_file = key_files
+
+            source = ssh_utils.jumpbox_command(jumpbox_ip, jumpbox_key_file)
+            source.append('cat {}'.format(snapshot.path))
+
+            sink = ssh_utils.ssh_command(
+                node.ip, node_key_file, jumpbox_ip, jumpbox_key_file,
+                ['BatchMode=yes', 'UserKnownHostsFile=/dev/null'])
+            sink.append(chain_api.snapshot_import_command())
+
+            ssh_utils.pipe(source, sink)
+
+    LOG.info("Seeding {} nodes of chain {} with snapshot {}".format(
+        len(nodes), chain.id, snapshot.path))
+
+    workers = max(1, min(len(nodes), CONF.snapshots.workers))
+    with futurist.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(seed, node) for node in nodes]
+
+    for node, future in zip(nodes, futures):
+        if future.exception() is not None:
+            LOG.warning("Could not seed node {}, it syncs from its peers "
+                        "instead: {}".format(node.id, future.exception()))
+
+
+def delete_snapshots(chain):
+    """Removes the snapshot archives of a chain from its jumpbox
+
+    The rows are deleted together with the chain.
+    """
+    context = db_api.get_context()
+    if not db_api.get_snapshots(context, chain.id):
+        return
+
+    cloud_config = chain.get_cloud_config()
+    with ssh_utils.private_key_files(cloud_config['jumpbox_key']) as key_files:
+        ssh_utils.run_on_jumpbox(cloud_config['jumpbox_ip'], key_files[0],
+                                 'rm -rf {}'.format(_snapshot_dir(chain.id)))
@@ -0,0 +1,176 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Warm pools of pre-booted, base-provisioned VMs
+
+A pool exists per (cloud, flavour, network, jumpbox). The VMs are booted with
+the cloud config of a chain using the pool's jumpbox, so they are only
+claimed by chains booting their nodes the same way. Creating a node claims a
+VM of the pool instead of booting a new one, the refiller (catena-manage
+warm_pool) replaces claimed VMs and reaps the ones that stayed idle for too
+long.
+"""
+
+import datetime
+import uuid
+
+import futurist
+from oslo_config import cfg
+from oslo_db.sqlalchemy import enginefacade
+from oslo_log import log
+
+from catena.chain_backends.ethereum import ethereum_api as chain_api
+from catena.common import keypool
+from catena.common import readiness
+from catena.common import ssh_utils
+from catena.common import utils
+from catena.db.sqlalchemy import api as db_api
+
+CONF = cfg.CONF
+LOG = log.getLogger(__name__)
+
+# Both read the public key from stdin
+_ADD_KEY_COMMAND = ('read -r key && '
+                    '(grep -qxF "$key" ~/.ssh/authorized_keys || '
+                    'printf "%s\\n" "$key" >> ~/.ssh/authorized_keys)')
+_REPLACE_KEYS_COMMAND = ('cat > ~/.ssh/authorized_keys.new && '
+                         'chmod 600 ~/.ssh/authorized_keys.new && '
+                         'mv ~/.ssh/authorized_keys.new '
+                         '~/.ssh/authorized_keys')
+
+
+def claim(context, chain, flavour, name, type, public_key, encrypted_key,
+          chain_config=None):
+    """Turns a VM of the pool into a node of the chain
+
+    Returns None if the pool is empty.
+    """
+    cloud_config = chain.get_cloud_config()
+
+    # The node keeps the key of the pool until the node key is authorized, so
+    # a resumed job can still reach the VM
+    with enginefacade.writer.using(context):
+        pooled = db_api.claim_pooled_node(context, chain.cloud_id, flavour,
+                                          cloud_config['network'],
+                                          cloud_config['jumpbox'])
+        if pooled is None:
+            return None
+
+        node = db_api.create_node(context, id=pooled.id, chain=chain,
+                                  ip=pooled.ip, ssh_key=pooled.ssh_key,
+                                  name=name, type=type, status='ip_assigned',
+                                  flavour=flavour, chain_config=chain_config)
+
+    LOG.info("Claimed VM {} of the warm pool for node {}".format(
+        pooled.id, name))
+
+    # The node key is added next to the pool key first and the pool key is
+    # only removed (by atomically replacing the file) once the node key has
+    # been saved, so one of the keys can reach the VM at any time
+    public_key = public_key.strip() + '\n'
+    _authorize_key(cloud_config, node.ip, node.ssh_key, public_key,
+                   _ADD_KEY_COMMAND)
+
+    node.ssh_key = encrypted_key
+    node.save(context)
+
+    _authorize_key(cloud_config, node.ip, node.ssh_key, public_key,
+                   _REPLACE_KEYS_COMMAND)
+    return node
+
+
+def _authorize_key(cloud_config, ip, encrypted_key, public_key, command):
+    with ssh_utils.private_key_files(
+            encrypted_key, cloud_config['jumpbox_key']) as key_files:
+        node_key_file, jumpbox_key_file = key_files
+        ssh_utils.run(ip, node_key_file, cloud_config['jumpbox_ip'],
+                      jumpbox_key_file, command, input=public_key)
+
+
+def refill(cloud_api, chain, flavour):
+    """Boots VMs until the pool of the chain's cloud and network is full"""
+    context = db_api.get_context()
+    cloud_config = chain.get_cloud_config()
+    network = cloud_config['network']
+    jumpbox = cloud_config['jumpbox']
+
+    missing = CONF.warm_pool.size - db_api.count_pooled_nodes(
+        context, chain.cloud_id, flavour, network, jumpbox)
+    if missing <= 0:
+        return
+
+    LOG.info("Booting {} VMs for the warm pool of cloud {} ({}, {}, "
+             "{})".format(missing, chain.cloud_id, flavour, network,
+                          jumpbox))
+
+    with futurist.ThreadPoolExecutor(
+            max_workers=CONF.jobs.boot_workers) as executor:
+        futures = [executor.submit(_boot, cloud_api, chain, flavour)
+                   for _ in range(missing)]
+
+    for future in futures:
+        if future.exception() is not None:
+            LOG.error("Could not boot a VM for the warm pool: {}".format(
+                future.exception()))
+
+
+def _boot(cloud_api, chain, flavour):
+    context = db_api.get_context()
+    cloud_config = chain.get_cloud_config()
+
+    public_key, encrypted_key = keypool.get_keypair()
+    name = 'catena-pool-{}'.format(uuid.uuid4().hex[:8])
+
+    id = cloud_api.create_server(public_key, flavour, name, chain)
+    db_api.create_pooled_node(context, id, chain.cloud_id, flavour,
+                              cloud_config['network'],
+                              cloud_config['jumpbox'], encrypted_key)
+
+    # A VM that never gets ready stays 'booting' until it is reaped
+    ip = cloud_api.wait_for_ip(chain, id)
+    db_api.update_pooled_node(context, id, {'ip': ip})
+
+    with ssh_utils.private_key_files(
+            encrypted_key, cloud_config['jumpbox_key']) as key_files:
+        node_key_file, jumpbox_key_file = key_files
+        readiness.wait_for_ssh(ip, node_key_file, cloud_config['jumpbox_ip'],
+                               jumpbox_key_file)
+
+    chain_api.prepare_node(cloud_api.provider_config, ip,
+                           encrypted_key, cloud_config['jumpbox_ip'],
+                           cloud_config['jumpbox_key'])
+
+    db_api.update_pooled_node(context, id, {'status': 'ready'})
+    LOG.debug("VM {} of the warm pool is ready".format(id))
+
+
+def reap(cloud_api, chain):
+    """Deletes the VMs of the chain's pools that are too old"""
+    context = db_api.get_context()
+    cloud_config = chain.get_cloud_config()
+    before = utils.utcnow() - datetime.timedelta(
+        seconds=CONF.warm_pool.max_age)
+
+    for pooled in db_api.claim_expired_pooled_nodes(
+            context, chain.cloud_id, cloud_config['network'],
+            cloud_config['jumpbox'], before):
+        LOG.info("Reaping VM {} of the warm pool".format(pooled.id))
+        try:
+            cloud_api.delete_node(chain, pooled.id)
+        except Exception:
+            LOG.exception("Could not reap VM {}".format(pooled.id))
+        else:
+            db_api.delete_pooled_node(context, pooled.id)
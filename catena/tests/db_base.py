@@ -0,0 +1,33 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from oslo_db.sqlalchemy import enginefacade
+from oslo_db.sqlalchemy import test_fixtures
+
+from catena.db.sqlalchemy import models
+from catena.tests import base
+
+
+class DbTestCase(base.TestCase):
+    """Runs the db api against an empty in-memory sqlite database"""
+
+    def setUp(self):
+        super(DbTestCase, self).setUp()
+
+        facade = enginefacade.transaction_context()
+        facade.configure(connection='sqlite://')
+        self.useFixture(test_fixtures.ReplaceEngineFacadeFixture(
+            enginefacade._context_manager, facade))
+        models.BASE.metadata.create_all(facade.writer.get_engine())
@@ -0,0 +1,85 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+test_chains
+----------------------------------
+
+Tests for listing chains through `catena.api.v1.chains` module.
+"""
+
+import falcon
+from falcon import testing
+from oslo_config import cfg
+from oslo_config import fixture as config_fixture
+
+from catena.api.v1 import chains
+from catena.common import config
+from catena.tests import db_base
+from catena.tests import test_db_api
+
+
+class TestListChains(db_base.DbTestCase):
+    def setUp(self):
+        super(TestListChains, self).setUp()
+        conf = self.useFixture(config_fixture.Config(cfg.CONF))
+        conf.register_opts(config._OPTS)
+        conf.config(max_limit=3)
+
+        test_db_api._create_chains(5)
+        self.resource = chains.ChainsResource()
+
+    def _get(self, query_string):
+        req = falcon.Request(testing.create_environ(
+            path='/v1/chains', query_string=query_string))
+        resp = falcon.Response()
+        self.resource.on_get(req, resp)
+        self.assertEqual(falcon.HTTP_200, resp.status)
+        return resp.data
+
+    def _names(self, query_string):
+        return [chain['name'] for chain in self._get(query_string)]
+
+    def test_sort(self):
+        self.assertEqual(['chain0', 'chain1'],
+                         self._names('sort=name:asc&limit=2'))
+        self.assertEqual(['chain4', 'chain3'],
+                         self._names('sort=name:desc&limit=2'))
+        # Without a direction the order is descending
+        self.assertEqual(['chain4', 'chain3'],
+                         self._names('sort=name&limit=2'))
+
+    def test_limit_is_capped(self):
+        self.assertEqual(3, len(self._names('limit=10')))
+        self.assertEqual(3, len(self._names('')))
+
+    def test_marker(self):
+        marker = self._get('sort=name:asc&limit=2')[-1]['id']
+        self.assertEqual(['chain2', 'chain3'], self._names(
+            'sort=name:asc&limit=2&marker={}'.format(marker)))
+
+    def test_filter(self):
+        self.assertEqual(['chain1', 'chain3'],
+                         self._names('status=active&sort=name:asc'))
+        # Only the whitelisted filters are passed on
+        self.assertEqual(3, len(self._names('name=chain0')))
+
+    def test_invalid_sort(self):
+        for sort in ('id', 'name:up', 'chain_config:asc'):
+            self.assertRaises(falcon.HTTPBadRequest, self._get,
+                              'sort={}'.format(sort))
+
+    def test_unknown_marker(self):
+        self.assertRaises(falcon.HTTPBadRequest, self._get, 'marker=missing')
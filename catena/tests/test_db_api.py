@@ -0,0 +1,250 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+test_db_api
+----------------------------------
+
+Tests for `catena.db.sqlalchemy.api` module.
+"""
+
+import datetime
+import json
+
+from catena.db.sqlalchemy import api as db_api
+from catena.service import service
+from catena.tests import db_base
+
+
+def _selects(queries):
+    # oslo.db emits an explicit BEGIN for every transaction on sqlite
+    return [query for query in queries if query.startswith('SELECT')]
+
+
+class TestQueryCounts(db_base.DbTestCase):
+    def setUp(self):
+        super(TestQueryCounts, self).setUp()
+
+        context = db_api.get_context()
+        cloud = db_api.create_cloud(context, 'openstack')
+        self.chains = []
+        for index in range(3):
+            chain = db_api.create_chain(
+                context, 'chain{}'.format(index), 'ethereum', cloud,
+                {'type': 'proof-of-work'}, {'jumpbox_ip': '10.0.0.1'})
+            chain.status = 'active'
+            chain.save(context)
+            for node in range(4):
+                db_api.create_node(
+                    context, '{}-{}'.format(chain.id, node), chain,
+                    '10.0.1.{}'.format(node), 'key', 'node', 'node',
+                    status='registered', chain_config={'signer': None})
+            self.chains.append(chain)
+
+    def test_get_chain(self):
+        context = db_api.get_context()
+        with db_api.count_queries() as queries:
+            chain = db_api.get_chain(context, self.chains[0].id)
+            chain.get_chain_config()
+            chain.get_cloud_config()
+        self.assertEqual(1, len(_selects(queries)))
+
+    def test_get_chain_loads_cloud_and_nodes(self):
+        context = db_api.get_context()
+        with db_api.count_queries() as queries:
+            chain = db_api.get_chain(context, self.chains[0].id,
+                                     load=('cloud', 'nodes'))
+        self.assertEqual(2, len(_selects(queries)))
+
+        # Nothing is loaded lazily once the session is closed
+        with db_api.count_queries() as queries:
+            self.assertEqual('openstack', chain.cloud.type)
+            self.assertEqual(4, len(chain.nodes))
+            for node in chain.nodes:
+                node.get_chain_config()
+        self.assertEqual(0, len(_selects(queries)))
+
+    def test_get_chain_models_loads_nodes_of_all_chains(self):
+        context = db_api.get_context()
+        with db_api.count_queries() as queries:
+            chains = db_api.get_chain_models(context, {'status': 'active'},
+                                             load=('nodes',))
+            nodes = [node for chain in chains for node in chain.nodes]
+            for node in nodes:
+                node.get_chain_config()
+        self.assertEqual(3, len(chains))
+        self.assertEqual(12, len(nodes))
+        self.assertEqual(2, len(_selects(queries)))
+
+    def test_service_get_nodes(self):
+        with db_api.count_queries() as queries:
+            nodes = service.get_nodes(self.chains[1].id)
+        self.assertEqual(4, len(nodes))
+        self.assertEqual({self.chains[1].id},
+                         set(node['chain_id'] for node in nodes))
+        self.assertEqual(1, len(_selects(queries)))
+
+    def test_service_get_chains_selects_listed_columns(self):
+        with db_api.count_queries() as queries:
+            chains = service.get_chains()
+        self.assertEqual(3, len(chains))
+        self.assertEqual({'type': 'proof-of-work'},
+                         json.loads(chains[0]['chain_config']))
+        self.assertEqual(1, len(_selects(queries)))
+        self.assertNotIn('cloud_config', _selects(queries)[0])
+
+
+def _create_chains(count):
+    """Creates chains with the same creation date, named by their index
+
+    Every other chain is active. The order of chains created at the same
+    time is only decided by the id tie-breaker.
+    """
+    context = db_api.get_context()
+    cloud = db_api.create_cloud(context, 'openstack')
+    for index in range(count):
+        chain = db_api.create_chain(context, 'chain{}'.format(index),
+                                    'ethereum', cloud, {}, {})
+        chain.created_at = datetime.datetime(2017, 1, 1)
+        chain.status = 'active' if index % 2 else 'creating'
+        chain.save(context)
+
+
+class TestPagination(db_base.DbTestCase):
+    def setUp(self):
+        super(TestPagination, self).setUp()
+        _create_chains(5)
+
+    def _pages(self, limit, **kwargs):
+        context = db_api.get_context()
+        pages = []
+        marker = None
+        while True:
+            page = db_api.get_chains(context, marker=marker, limit=limit,
+                                     columns=('id', 'name'), **kwargs)
+            if not page:
+                return pages
+            pages.append(page)
+            marker = page[-1]['id']
+
+    def test_pages_continue_after_marker(self):
+        pages = self._pages(2)
+        self.assertEqual([2, 2, 1], [len(page) for page in pages])
+
+        ids = [chain['id'] for page in pages for chain in page]
+        # The dates are equal, so the default (newest first) order is by id
+        self.assertEqual(sorted(ids, reverse=True), ids)
+        self.assertEqual(5, len(set(ids)))
+
+    def test_sort_dir(self):
+        for sort_dir, names in (('asc', ['chain0', 'chain1', 'chain2',
+                                         'chain3', 'chain4']),
+                                ('desc', ['chain4', 'chain3', 'chain2',
+                                          'chain1', 'chain0'])):
+            pages = self._pages(2, sort_key=['name'], sort_dir=sort_dir)
+            self.assertEqual(names, [chain['name'] for page in pages
+                                     for chain in page])
+
+    def test_filter(self):
+        pages = self._pages(1, filters={'status': 'active'},
+                            sort_key=['name'], sort_dir='asc')
+        self.assertEqual(['chain1', 'chain3'],
+                         [chain['name'] for page in pages for chain in page])
+
+    def test_disallowed_filter(self):
+        context = db_api.get_context()
+        self.assertRaises(ValueError, db_api.get_chains, context,
+                          filters={'name': 'chain0'})
+
+    def test_unknown_marker(self):
+        context = db_api.get_context()
+        self.assertRaises(ValueError, db_api.get_chains, context,
+                          marker='missing', limit=2)
+
+
+class TestJobLeases(db_base.DbTestCase):
+    def setUp(self):
+        super(TestJobLeases, self).setUp()
+        self.now = datetime.datetime(2017, 1, 1, 12, 0)
+        self.lease = datetime.timedelta(seconds=120)
+
+    def _create_job(self):
+        return db_api.create_job(db_api.get_context(), 'benchmark', {}).id
+
+    def _claim(self, job_id, now):
+        return db_api.claim_job(db_api.get_context(), job_id, now,
+                                now - self.lease)
+
+    def test_pending_job_is_claimed_once(self):
+        job_id = self._create_job()
+        self.assertEqual([job_id], db_api.get_claimable_job_ids(
+            db_api.get_context(), self.now - self.lease))
+
+        self.assertTrue(self._claim(job_id, self.now))
+        job = db_api.get_job(db_api.get_context(), job_id)
+        self.assertEqual('running', job.status)
+        self.assertEqual(self.now, job.heartbeat_at)
+
+        # Another worker within the lease
+        within = self.now + datetime.timedelta(seconds=60)
+        self.assertFalse(self._claim(job_id, within))
+        self.assertEqual([], db_api.get_claimable_job_ids(
+            db_api.get_context(), self.now - self.lease))
+
+    def test_expired_lease_is_taken_over(self):
+        job_id = self._create_job()
+        self.assertTrue(self._claim(job_id, self.now))
+
+        later = self.now + self.lease + datetime.timedelta(seconds=1)
+        self.assertEqual([job_id], db_api.get_claimable_job_ids(
+            db_api.get_context(), later - self.lease))
+        self.assertTrue(self._claim(job_id, later))
+        self.assertEqual(later, db_api.get_job(db_api.get_context(),
+                                               job_id).heartbeat_at)
+
+        # The new lease holds off the next worker
+        self.assertFalse(self._claim(
+            job_id, later + datetime.timedelta(seconds=1)))
+
+    def test_finished_job_is_not_claimed(self):
+        job_id = self._create_job()
+        db_api.update_job(db_api.get_context(), job_id,
+                          {'status': 'succeeded'})
+        self.assertFalse(self._claim(job_id, self.now))
+
+    def test_renew_jobs_only_renews_running_jobs(self):
+        running_id = self._create_job()
+        self.assertTrue(self._claim(running_id, self.now))
+        pending_id = self._create_job()
+        finished_id = self._create_job()
+        db_api.update_job(db_api.get_context(), finished_id,
+                          {'status': 'failed'})
+
+        later = self.now + datetime.timedelta(seconds=60)
+        db_api.renew_jobs(db_api.get_context(),
+                          [running_id, pending_id, finished_id], later)
+
+        context = db_api.get_context()
+        running = db_api.get_job(context, running_id)
+        self.assertEqual(('running', later),
+                         (running.status, running.heartbeat_at))
+        for job_id, status in ((pending_id, 'pending'),
+                               (finished_id, 'failed')):
+            job = db_api.get_job(context, job_id)
+            self.assertEqual((status, None), (job.status, job.heartbeat_at))
+
+        # The renewed job stays claimed past its first lease
+        expired = self.now + self.lease + datetime.timedelta(seconds=1)
+        self.assertFalse(self._claim(running_id, expired))
@@ -0,0 +1,81 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+test_keypool
+----------------------------------
+
+Tests for `catena.common.keypool` module.
+"""
+
+import os
+import signal
+import time
+
+from oslo_config import cfg
+from oslo_config import fixture as config_fixture
+
+from catena.common import config
+from catena.common import keypool
+from catena.tests import base
+
+
+def _wait_for(condition, timeout=30):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("Timed out waiting for the key pool")
+        time.sleep(0.05)
+
+
+class TestKeyPool(base.TestCase):
+    def setUp(self):
+        super(TestKeyPool, self).setUp()
+        conf = self.useFixture(config_fixture.Config(cfg.CONF))
+        conf.register_opts(config._OPTS)
+        conf.register_opts(config._SSH_OPTS, 'ssh')
+        conf.config(encryption_key='secret')
+        conf.config(key_algorithm='ed25519', group='ssh')
+
+        self.pool = keypool.KeyPool(2)
+        self.addCleanup(lambda: self.pool._executor.shutdown(wait=False))
+
+    def _ready(self):
+        return len(self.pool._keypairs) == 2 and self.pool._pending == 0
+
+    def test_get_refills(self):
+        self.pool.refill()
+        _wait_for(self._ready)
+
+        public_key, _ = self.pool.get()
+        self.assertTrue(public_key.startswith('ssh-ed25519 '))
+        _wait_for(self._ready)
+
+    def test_killed_process_is_replaced(self):
+        self.pool.refill()
+        _wait_for(self._ready)
+
+        executor = self.pool._executor
+        for pid in list(executor._processes):
+            os.kill(pid, signal.SIGKILL)
+        _wait_for(lambda: executor._broken)
+
+        # The ready keypairs are still handed out
+        ready = list(self.pool._keypairs)
+        self.assertEqual(ready[0], self.pool.get())
+        self.assertEqual(ready[1], self.pool.get())
+
+        self.assertIsNot(executor, self.pool._executor)
+        _wait_for(self._ready)
@@ -0,0 +1,111 @@
+# (C) Copyright 2017 Hewlett Packard Enterprise Development LP.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+test_timeseries
+----------------------------------
+
+Tests for `catena.common.timeseries` module.
+"""
+
+from catena.common import timeseries
+from catena.tests import base
+
+FIELDS = (('up', min), ('block', max), ('peers', timeseries.mean))
+
+
+def _points(series, index):
+    return series.to_dict()['resolutions'][index]['points']
+
+
+class TestTimeSeries(base.TestCase):
+    def test_finest_resolution_is_a_ring_buffer(self):
+        series = timeseries.TimeSeries(FIELDS, ((0, 3),))
+        for timestamp in range(5):
+            series.add(timestamp, {'up': 1, 'block': timestamp, 'peers': 2})
+
+        self.assertEqual([[2, 1, 2, 2], [3, 1, 3, 2], [4, 1, 4, 2]],
+                         _points(series, 0))
+
+    def test_coarse_resolution_is_a_ring_buffer(self):
+        series = timeseries.TimeSeries(FIELDS, ((10, 2),))
+        for timestamp in range(0, 50, 10):
+            series.add(timestamp, {'up': 1, 'block': timestamp, 'peers': 2})
+
+        # The bucket of 40 is still open
+        self.assertEqual([[20, 1, 20, 2.0], [30, 1, 30, 2.0]],
+                         _points(series, 0))
+
+    def test_bucket_is_aggregated_once_complete(self):
+        series = timeseries.TimeSeries(FIELDS, ((0, 10), (60, 10)))
+        series.add(0, {'up': 1, 'block': 5, 'peers': 2})
+        series.add(30, {'up': 0, 'block': 7, 'peers': 4})
+        self.assertEqual([], _points(series, 1))
+
+        series.add(61, {'up': 1, 'block': 9, 'peers': 6})
+        self.assertEqual([[0, 0, 7, 3.0]], _points(series, 1))
+        self.assertEqual([[61, 1, 9, 6]],
+                         series.to_dict()['resolutions'][1]['bucket'])
+        self.assertEqual(3, len(_points(series, 0)))
+
+    def test_none_values_are_left_out_of_aggregates(self):
+        series = timeseries.TimeSeries(FIELDS, ((60, 10),))
+        series.add(0, {'up': 0})
+        series.add(10, {'up': 1, 'block': 7, 'peers': 4})
+        series.add(20, {'up': 1, 'block': None, 'peers': 2})
+        series.add(60, {'up': 1})
+        series.add(120, {'up': 1})
+
+        self.assertEqual([[0, 0, 7, 3.0], [60, 1, None, None]],
+                         _points(series, 0))
+
+    def test_from_dict_restores_series(self):
+        resolutions = ((0, 10), (60, 10))
+        series = timeseries.TimeSeries(FIELDS, resolutions)
+        series.add(0, {'up': 1, 'block': 5, 'peers': 2})
+        series.add(60, {'up': 1, 'block': 6, 'peers': 2})
+
+        restored = timeseries.TimeSeries.from_dict(FIELDS, resolutions,
+                                                   series.to_dict())
+        self.assertEqual(series.to_dict(), restored.to_dict())
+
+        restored.add(120, {'up': 0, 'block': 6, 'peers': 0})
+        self.assertEqual([[0, 1, 5, 2.0], [60, 1, 6, 2.0]],
+                         _points(restored, 1))
+
+    def test_from_dict_discards_other_resolutions(self):
+        series = timeseries.TimeSeries(FIELDS, ((0, 10), (60, 10)))
+        series.add(0, {'up': 1, 'block': 5, 'peers': 2})
+        data = series.to_dict()
+
+        for resolutions in (((0, 20), (60, 10)), ((0, 10), (300, 10)),
+                            ((0, 10),)):
+            restored = timeseries.TimeSeries.from_dict(FIELDS, resolutions,
+                                                       data)
+            self.assertEqual([[] for _ in resolutions],
+                             [resolution['points'] for resolution in
+                              restored.to_dict()['resolutions']])
+
+    def test_from_dict_discards_other_fields(self):
+        series = timeseries.TimeSeries(FIELDS, ((0, 10),))
+        series.add(0, {'up': 1, 'block': 5, 'peers': 2})
+
+        restored = timeseries.TimeSeries.from_dict(FIELDS[:2], ((0, 10),),
+                                                   series.to_dict())
+        self.assertEqual([], _points(restored, 0))
+
+    def test_from_dict_without_data(self):
+        series = timeseries.TimeSeries.from_dict(FIELDS, ((0, 10),), None)
+        self.assertEqual([], _points(series, 0))